@@ -1,20 +1,90 @@
 import asyncio
 import logging
+import os
+from dataclasses import asdict
+from typing import Any, Dict
 
 import uvloop
+from arq.connections import RedisSettings as ArqRedisSettings
 from arq.worker import Worker
 
+from .config import DataProcessingSettings, RedisSettings
+from .utils.clean_jobs import (
+    PROGRESS_TTL_SECONDS,
+    job_dir,
+    planned_stages,
+    progress_key,
+    progress_record,
+    result_path,
+    run_clean_job,
+    sweep_results,
+    upload_path,
+)
+
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
+processing_settings = DataProcessingSettings()
+redis_settings = RedisSettings()
+
 
 async def sample_background_task(ctx: Worker, name: str) -> str:
     await asyncio.sleep(5)
     return f"Task {name} is complete!"
 
+
+async def clean_crypto_job(ctx: Worker, filename: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Clean an upload spooled by `/jobs/clean` into a parquet result next to it. The pandas work
+    runs on a thread so the worker keeps heartbeating; each finished stage is published to Redis
+    for `/jobs/status/{job_id}`.
+    """
+    job_id = ctx["job_id"]
+    redis = ctx["redis"]
+    loop = asyncio.get_running_loop()
+    directory = job_dir(processing_settings.CLEAN_JOB_DIR)
+    source = upload_path(directory, job_id)
+    target = result_path(directory, job_id)
+
+    planned = planned_stages(options)
+    done = []
+    updates: asyncio.Queue = asyncio.Queue()
+
+    def on_stage(stats) -> None:
+        done.append(stats)
+        loop.call_soon_threadsafe(updates.put_nowait, progress_record(planned, done))
+
+    async def publish() -> None:
+        # one writer, so records land in stage order
+        while (record := await updates.get()) is not None:
+            await redis.set(progress_key(job_id), record, ex=PROGRESS_TTL_SECONDS)
+
+    updates.put_nowait(progress_record(planned, done))
+    publisher = asyncio.create_task(publish())
+    try:
+        report = await asyncio.to_thread(run_clean_job, source, filename, target, options, on_stage)
+    finally:
+        loop.call_soon(updates.put_nowait, None)
+        await publisher
+        if os.path.exists(source):
+            os.remove(source)
+    return {"result_path": target, "report": asdict(report)}
+
+
 async def startup(ctx: Worker) -> None:
+    sweep_results(job_dir(processing_settings.CLEAN_JOB_DIR), processing_settings.CLEAN_JOB_RESULT_TTL_SECONDS)
     logging.info("Worker Started")
 
+
 async def shutdown(ctx: Worker) -> None:
     logging.info("Worker end")
+
+
+class WorkerSettings:
+    functions = [sample_background_task, clean_crypto_job]
+    redis_settings = ArqRedisSettings(host=redis_settings.HOST, port=redis_settings.PORT)
+    on_startup = startup
+    on_shutdown = shutdown
+    job_timeout = processing_settings.CLEAN_JOB_TIMEOUT_SECONDS
+    keep_result = processing_settings.CLEAN_JOB_RESULT_TTL_SECONDS
@@ -1,12 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from dataclasses import asdict
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from models import Partition
 from schemas import PartitionCreate, PartitionOut, PartitionUpdate
 from database import get_db
+from config import DataProcessingSettings
+from crud.partition import sync_partitions
+from utils.data import clean_crypto_df, read_any, to_parquet_bytes
+from utils.dataset import DatasetStore, HotTier, dataset_dir
 
 
 router = APIRouter()
 
+processing_settings = DataProcessingSettings()
+hot_tier = (
+    HotTier(
+        processing_settings.CLEAN_HOT_DIR,
+        processing_settings.CLEAN_HOT_MAX_BYTES,
+        promote_after=processing_settings.CLEAN_HOT_PROMOTE_AFTER,
+    )
+    if processing_settings.CLEAN_HOT_DIR
+    else None
+)
+dataset_store = DatasetStore(
+    dataset_dir(processing_settings.CLEAN_DATASET_DIR),
+    hot=hot_tier,
+)
+
+
+@router.post("/dataset")
+def store_cleaned_dataset(
+    uploaded_file: UploadFile = File(...),
+    pair_separator: Optional[str] = Form('/'),
+    ticker_map_json: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+):
+    """Clean an upload and merge it into the partitioned dataset store, updating the partition rows."""
+    ticker_map = json.loads(ticker_map_json) if ticker_map_json else None
+    df = read_any(uploaded_file.file.read(), uploaded_file.filename, project=True)
+    # stored rows are kept at their original resolution; resampling happens at query time
+    cleaned, report = clean_crypto_df(df, symbol_map=ticker_map, base_quote_sep=pair_separator or None, copy=False)
+    try:
+        stats = dataset_store.write(cleaned)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    partitions = sync_partitions(db, stats)
+    return {
+        "summary": asdict(report),
+        "partitions": [
+            {"id": p.id, "name": p.name, "size_bytes": p.size_bytes, "record_count": p.record_count}
+            for p in partitions
+        ],
+    }
+
+
+@router.get("/dataset/query")
+def query_dataset(
+    tickers: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    columns: Optional[List[str]] = Query(None),
+    format: Literal["json","parquet"] = Query("json"),
+):
+    """Stored rows of `tickers` with start <= timestamp < end; only the matching partitions are read."""
+    df = dataset_store.read(tickers, start, end, columns)
+    if format == "parquet":
+        return Response(
+            to_parquet_bytes(df),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": 'attachment; filename="dataset.parquet"'},
+        )
+    return Response(df.to_json(orient="records", date_format="iso"), media_type="application/json")
+
+
 @router.post("/", response_model=PartitionOut)
 def create_partition(payload: PartitionCreate, db: Session = Depends(get_db)):
     db_partition = Partition(name=payload.name, description=payload.description)
@@ -43,6 +114,8 @@ def delete_partition(partition_id: str, db: Session = Depends(get_db)):
     db_partition = db.query(Partition).filter(Partition.id == partition_id).first()
     if db_partition is None:
         raise HTTPException(status_code=404, detail="Partition not found")
+    if dataset_store.is_partition(db_partition.name):
+        dataset_store.delete(db_partition.name)
     db.delete(db_partition)
     db.commit()
-    return None
\ No newline at end of file
+    return None
@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from fastcrud.paginated import PaginatedListResponse, compute_offset, paginated_response
 
 from ...api.dependencies import get_current_superuser, get_current_user
-from ...core.db.database import async_get_db
+from ...core.db.database import async_get_db, local_session
 from ...core.exceptions.http_exceptions import ForbiddenException, NotFoundException
 from ...core.utils.cache import cache
 from ...crud.crud_posts import crud_posts
@@ -34,18 +34,10 @@ async def create_post(
         raise NotFoundException("پست ایجاد شده یافت نشد")
     return post_out
 
-@router.get("/{username}/posts", response_model=PaginatedListResponse[PostRead])
-@cache(key_prefix="{username}_posts_cache:page_{page}", resource_id_name="username", expiration=90)
-async def list_posts(
-    req: Request,
-    username: str,
-    db: Annotated[AsyncSession, Depends(async_get_db)],
-    page: int = 1,
-    items_per_page: int = 10,
-) -> dict:
+async def _get_posts_page(db: AsyncSession, username: str, page: int, items_per_page: int) -> dict | None:
     user_obj = await crud_users.get(db, username=username, is_deleted=False)
     if not user_obj:
-        raise NotFoundException("کاربر یافت نشد")
+        return None
     posts_list = await crud_posts.get_multi(
         db,
         offset=(page-1)*items_per_page,
@@ -55,8 +47,44 @@ async def list_posts(
     )
     return paginated_response(posts_list, page=page, items_per_page=items_per_page)
 
+async def _get_post(db: AsyncSession, username: str, post_id: int) -> dict | None:
+    user_obj = await crud_users.get(db, username=username, is_deleted=False)
+    if not user_obj:
+        return None
+    return await crud_posts.get(db, id=post_id, created_by_user_id=user_obj.id, is_deleted=False)
+
+async def load_posts_page(username: str, page: int, items_per_page: int = 10) -> dict | None:
+    """Cache loader for `list_posts`, used to refresh list pages after post mutations."""
+    async with local_session() as db:
+        return await _get_posts_page(db, username, page, items_per_page)
+
+async def load_post(username: str, post_id: int) -> dict | None:
+    """Cache loader for `get_post`, used to write edited posts through to the cache."""
+    async with local_session() as db:
+        return await _get_post(db, username, post_id)
+
+@router.get("/{username}/posts", response_model=PaginatedListResponse[PostRead])
+@cache(key_prefix="{username}_posts_cache:page_{page}", resource_id_name="username", expiration=90, loader=load_posts_page)
+async def list_posts(
+    req: Request,
+    username: str,
+    db: Annotated[AsyncSession, Depends(async_get_db)],
+    page: int = 1,
+    items_per_page: int = 10,
+) -> dict:
+    posts_page = await _get_posts_page(db, username, page, items_per_page)
+    if posts_page is None:
+        raise NotFoundException("کاربر یافت نشد")
+    return posts_page
+
 @router.get("/{username}/post/{post_id}", response_model=PostRead)
-@cache(key_prefix="{username}_single_post_cache", resource_id_name="post_id")
+@cache(
+    key_prefix="{username}_single_post_cache",
+    resource_id_name="post_id",
+    loader=load_post,
+    local_ttl=5,
+    local_max_entries=4096,
+)
 async def get_post(
     req: Request, username: str, post_id: int, db: Annotated[AsyncSession, Depends(async_get_db)]
 ) -> PostRead:
@@ -69,7 +97,12 @@ async def get_post(
     return post_obj
 
 @router.patch("/{username}/post/{post_id}")
-@cache("{username}_single_post_cache", resource_id_name="post_id", pattern_to_invalidate_extra=["{username}_posts_cache:*"])
+@cache(
+    "{username}_single_post_cache",
+    resource_id_name="post_id",
+    pattern_to_invalidate_extra=["{username}_posts_cache:*"],
+    write_through=True,
+)
 async def update_post(
     req: Request,
     username: str,
@@ -90,7 +123,12 @@ async def update_post(
     return {"message": "پست به‌روز شد"}
 
 @router.delete("/{username}/post/{post_id}")
-@cache("{username}_single_post_cache", resource_id_name="post_id", to_invalidate_extra={"{username}_posts_cache": "{username}"})
+@cache(
+    "{username}_single_post_cache",
+    resource_id_name="post_id",
+    pattern_to_invalidate_extra=["{username}_posts_cache:*"],
+    write_through=True,
+)
 async def delete_post(
     req: Request,
     username: str,
@@ -110,7 +148,12 @@ async def delete_post(
     return {"message": "پست حذف شد"}
 
 @router.delete("/{username}/db_post/{post_id}", dependencies=[Depends(get_current_superuser)])
-@cache("{username}_single_post_cache", resource_id_name="post_id", to_invalidate_extra={"{username}_posts_cache": "{username}"})
+@cache(
+    "{username}_single_post_cache",
+    resource_id_name="post_id",
+    pattern_to_invalidate_extra=["{username}_posts_cache:*"],
+    write_through=True,
+)
 async def hard_delete_post(
     req: Request, username: str, post_id: int, db: Annotated[AsyncSession, Depends(async_get_db)]
 ) -> dict[str, str]:
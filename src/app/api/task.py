@@ -1,11 +1,20 @@
-from typing import Any
-from fastapi import APIRouter, Depends, HTTPException
-from arq.jobs import Job as ArqJob
+import asyncio
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.responses import FileResponse
+from arq.jobs import Job as ArqJob, JobStatus
 from ...core.utils import queue
 from ...api.dependencies import rate_limiter_dependency
 from ...schemas.job import Job
+from ..config import DataProcessingSettings
+from ..utils.clean_jobs import job_dir, progress_key, upload_path
 
 task_router = APIRouter(prefix="/jobs", tags=["job_tasks"])
+processing_settings = DataProcessingSettings()
 
 async def _check_queue() -> Any:
     q = queue.pool
@@ -21,9 +30,72 @@ async def add_job_to_queue(task_message: str):
         raise HTTPException(status_code=500, detail="Failed to enqueue task")
     return {"id": new_job.job_id}
 
+@task_router.post("/clean", response_model=Job, status_code=201, dependencies=[Depends(rate_limiter_dependency)])
+async def enqueue_clean_job(
+    uploaded_file: UploadFile = File(...),
+    resample_interval: Optional[str] = Form(None),
+    pair_separator: Optional[str] = Form('/'),
+    fill_method: str = Form('ffill'),
+    ticker_map_json: Optional[str] = Form(None),
+):
+    q = await _check_queue()
+    job_id = uuid.uuid4().hex
+    spool = upload_path(job_dir(processing_settings.CLEAN_JOB_DIR), job_id)
+
+    def _spool() -> None:
+        uploaded_file.file.seek(0)
+        with open(spool, "wb") as f:
+            shutil.copyfileobj(uploaded_file.file, f, 1024 * 1024)
+
+    await asyncio.to_thread(_spool)
+    options = dict(
+        symbol_map=json.loads(ticker_map_json) if ticker_map_json else None,
+        base_quote_sep=pair_separator or None,
+        resample_to=resample_interval,
+        freq_fill=fill_method,
+    )
+    new_job = await q.enqueue_job("clean_crypto_job", uploaded_file.filename, options, _job_id=job_id)
+    if new_job is None:
+        os.remove(spool)
+        raise HTTPException(status_code=500, detail="Failed to enqueue task")
+    return {"id": new_job.job_id}
+
 @task_router.get("/status/{job_id}")
 async def get_job_info(job_id: str):
     q = await _check_queue()
     job_instance = ArqJob(job_id, q)
     job_data = await job_instance.info()
-    return job_data.__dict__ if job_data else None
+    if job_data is None:
+        return None
+    info: Dict[str, Any] = dict(job_data.__dict__)
+    progress = await q.get(progress_key(job_id))
+    if progress is not None:
+        info["progress"] = json.loads(progress)
+    return info
+
+async def _clean_result(job_id: str) -> Dict[str, Any]:
+    q = await _check_queue()
+    job_instance = ArqJob(job_id, q)
+    status = await job_instance.status()
+    if status == JobStatus.not_found:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status != JobStatus.complete:
+        raise HTTPException(status_code=409, detail=f"Job is {status.value}")
+    result = await job_instance.result_info()
+    if result is None or result.function != "clean_crypto_job":
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not result.success:
+        raise HTTPException(status_code=500, detail=f"Job failed: {result.result}")
+    return result.result
+
+@task_router.get("/clean/{job_id}/report")
+async def get_clean_report(job_id: str):
+    result = await _clean_result(job_id)
+    return result["report"]
+
+@task_router.get("/clean/{job_id}/result")
+async def get_clean_result(job_id: str):
+    result = await _clean_result(job_id)
+    if not os.path.exists(result["result_path"]):
+        raise HTTPException(status_code=410, detail="Job result has expired")
+    return FileResponse(result["result_path"], media_type="application/vnd.apache.parquet", filename=f"{job_id}.parquet")
@@ -72,4 +72,25 @@ class CRUDAdminSettings(BaseSettings):
     REDIS_PORT: int = config("CRUD_ADMIN_REDIS_PORT", default=6379)
     REDIS_DB: int = config("CRUD_ADMIN_REDIS_DB", default=0)
     REDIS_PASSWORD: Optional[str] = config("CRUD_ADMIN_REDIS_PASSWORD", default=None)
-    REDIS_SSL: bool = config("CRUD_ADMIN_REDIS_SSL", default=False)
\ No newline at end of file
+    REDIS_SSL: bool = config("CRUD_ADMIN_REDIS_SSL", default=False)
+
+class DataProcessingSettings(BaseSettings):
+    CLEAN_STREAM_THRESHOLD_BYTES: int = config("CLEAN_STREAM_THRESHOLD_BYTES", cast=int, default=256 * 1024 * 1024)
+    CLEAN_STREAM_CHUNK_ROWS: int = config("CLEAN_STREAM_CHUNK_ROWS", cast=int, default=500_000)
+    CLEAN_STREAM_RESERVOIR_SIZE: int = config("CLEAN_STREAM_RESERVOIR_SIZE", cast=int, default=100_000)
+    CLEAN_STREAM_RESERVOIR_BUDGET: int = config("CLEAN_STREAM_RESERVOIR_BUDGET", cast=int, default=4_000_000)
+    CLEAN_STREAM_SPOOL_DIR: Optional[str] = config("CLEAN_STREAM_SPOOL_DIR", default=None)
+    CLEAN_EXECUTOR_KIND: str = config("CLEAN_EXECUTOR_KIND", default="process")
+    CLEAN_EXECUTOR_WORKERS: Optional[int] = config("CLEAN_EXECUTOR_WORKERS", cast=int, default=None)
+    CLEAN_EXECUTOR_MAX_PENDING: Optional[int] = config("CLEAN_EXECUTOR_MAX_PENDING", cast=int, default=None)
+    CLEAN_JOB_TIMEOUT_SECONDS: float = config("CLEAN_JOB_TIMEOUT_SECONDS", cast=float, default=300.0)
+    CLEAN_RETRY_AFTER_SECONDS: int = config("CLEAN_RETRY_AFTER_SECONDS", cast=int, default=5)
+    CLEAN_CACHE_DIR: Optional[str] = config("CLEAN_CACHE_DIR", default=None)
+    CLEAN_CACHE_MAX_BYTES: int = config("CLEAN_CACHE_MAX_BYTES", cast=int, default=2 * 1024 * 1024 * 1024)
+    CLEAN_CACHE_REDIS_URL: Optional[str] = config("CLEAN_CACHE_REDIS_URL", default=None)
+    CLEAN_JOB_DIR: Optional[str] = config("CLEAN_JOB_DIR", default=None)
+    CLEAN_JOB_RESULT_TTL_SECONDS: int = config("CLEAN_JOB_RESULT_TTL_SECONDS", cast=int, default=24 * 3600)
+    CLEAN_DATASET_DIR: Optional[str] = config("CLEAN_DATASET_DIR", default=None)
+    CLEAN_HOT_DIR: Optional[str] = config("CLEAN_HOT_DIR", default=None)
+    CLEAN_HOT_MAX_BYTES: int = config("CLEAN_HOT_MAX_BYTES", cast=int, default=1024 * 1024 * 1024)
+    CLEAN_HOT_PROMOTE_AFTER: int = config("CLEAN_HOT_PROMOTE_AFTER", cast=int, default=3)
@@ -0,0 +1,35 @@
+import uuid
+from datetime import datetime
+from typing import Iterable, List
+
+from sqlalchemy.orm import Session
+
+from models import Partition
+from utils.dataset import PartitionStats
+
+
+def sync_partitions(db: Session, stats: Iterable[PartitionStats]) -> List[Partition]:
+    """Create or update the `Partition` row of each written dataset partition with its size and record count."""
+    stats = list(stats)
+    if not stats:
+        return []
+    names = [s.name for s in stats]
+    existing = {p.name: p for p in db.query(Partition).filter(Partition.name.in_(names)).all()}
+    now = datetime.utcnow()
+    rows = []
+    for s in stats:
+        partition = existing.get(s.name)
+        if partition is None:
+            partition = Partition(
+                id=str(uuid.uuid4()),
+                name=s.name,
+                description=f"{s.ticker} {s.date}",
+                created_at=now,
+            )
+            db.add(partition)
+        partition.size_bytes = s.size_bytes
+        partition.record_count = s.record_count
+        partition.updated_at = now
+        rows.append(partition)
+    db.commit()
+    return rows
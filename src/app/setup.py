@@ -1,5 +1,6 @@
+import asyncio
 from collections.abc import AsyncGenerator, Callable
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from typing import Any
 
 import fastapi
@@ -9,6 +10,7 @@ from arq.connections import RedisSettings
 from fastapi import APIRouter, Depends, FastAPI
 from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
+from fastapi.responses import PlainTextResponse
 
 from ..api.dependencies import get_current_superuser
 from ..core.utils.rate_limit import rate_limiter
@@ -27,6 +29,7 @@ from .config import (
 )
 from .db.database import async_engine as engine
 from .utils import cache, queue
+from .utils.cache_metrics import metrics
 
 
 async def init_database() -> None:
@@ -37,9 +40,14 @@ async def init_database() -> None:
 async def init_redis_cache() -> None:
     cache.pool = redis.ConnectionPool.from_url(settings.REDIS_CACHE_URL)
     cache.client = redis.Redis.from_pool(cache.pool)
+    cache.invalidation_listener = asyncio.create_task(cache.listen_for_invalidations())
 
 
 async def close_redis_cache() -> None:
+    if cache.invalidation_listener:
+        cache.invalidation_listener.cancel()
+        with suppress(asyncio.CancelledError):
+            await cache.invalidation_listener
     if cache.client:
         await cache.client.aclose()
 
@@ -119,6 +127,12 @@ def create_application(
     app = FastAPI(lifespan=lifespan, **kwargs)
     app.include_router(router)
 
+    if isinstance(settings, RedisCacheSettings):
+
+        @app.get("/metrics", include_in_schema=False)
+        async def cache_metrics() -> PlainTextResponse:
+            return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
     if isinstance(settings, ClientSideCacheSettings):
         app.add_middleware(ClientCacheMiddleware, max_age=settings.CLIENT_CACHE_MAX_AGE)
 
@@ -2,6 +2,7 @@ from datetime import UTC, datetime
 from typing import Optional
 
 from redis.asyncio import ConnectionPool, Redis
+from redis.commands.core import AsyncScript
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...core.logger import logging
@@ -9,15 +10,29 @@ from ...schemas.rate_limit import sanitize_path
 
 logger = logging.getLogger(__name__)
 
+# fixed-window hit: increments the window's counter and returns it with the seconds until the
+# window ends (ARGV[1], a unix time), when the key expires. Running as one script, a counter can
+# no longer be left without an expiry; keys found without one get it back.
+_HIT_WINDOW = """
+local count = redis.call("incr", KEYS[1])
+local ttl = redis.call("ttl", KEYS[1])
+if ttl < 0 then
+    redis.call("expireat", KEYS[1], ARGV[1])
+    ttl = redis.call("ttl", KEYS[1])
+end
+return {count, ttl}
+"""
+
 
 class RateLimiter:
     _instance: Optional["RateLimiter"] = None
     pool: Optional[ConnectionPool] = None
     client: Optional[Redis] = None
+    hit_window: Optional[AsyncScript] = None
 
     def __new__(cls) -> "RateLimiter":
         if cls._instance is None:
-            cls._instance = super().__new(cls)
+            cls._instance = super().__new__(cls)
         return cls._instance
 
     @classmethod
@@ -26,6 +41,8 @@ class RateLimiter:
         if instance.pool is None:
             instance.pool = ConnectionPool.from_url(redis_url)
             instance.client = Redis(connection_pool=instance.pool)
+            # runs with EVALSHA, loading the script again if the server lost it
+            instance.hit_window = instance.client.register_script(_HIT_WINDOW)
 
     @classmethod
     def get_client(cls) -> Redis:
@@ -35,27 +52,26 @@ class RateLimiter:
             raise Exception("Redis client is not initialized.")
         return instance.client
 
-    async def is_rate_limited(self, db: AsyncSession, user_id: int, path: str, limit: int, period: int) -> bool:
-        client = self.get_client()
+    async def hit(self, user_id: int, path: str, period: int) -> tuple[int, int]:
+        """Count a request in the current window; returns the window's count and the unix time it resets at."""
+        self.get_client()
         current_timestamp = int(datetime.now(UTC).timestamp())
         window_start = current_timestamp - (current_timestamp % period)
 
         sanitized_path = sanitize_path(path)
         key = f"ratelimit:{user_id}:{sanitized_path}:{window_start}"
 
-        try:
-            current_count = await client.incr(key)
-            if current_count == 1:
-                await client.expire(key, period)
-
-            if current_count > limit:
-                return False
+        count, ttl = await self.hit_window(keys=[key], args=[window_start + period])
+        return int(count), current_timestamp + max(int(ttl), 0)
 
+    async def is_rate_limited(self, db: AsyncSession, user_id: int, path: str, limit: int, period: int) -> bool:
+        try:
+            current_count, _ = await self.hit(user_id, path, period)
         except Exception as e:
             logger.exception(f"Error checking rate limit for user {user_id} on path {path}: {e}")
             raise e
 
-        return True
+        return current_count > limit
 
 
 rate_limiter = RateLimiter()
@@ -0,0 +1,252 @@
+"""
+Benchmarks for the cleaning pipeline on synthetic OHLCV data.
+
+Run from src/app, e.g.
+
+    python -m utils.bench --rows 1000000 --tickers 50 --format csv --out bench.json
+
+Each stage is timed on its own and its peak resident memory is sampled while it runs; the
+results are written as JSON so runs on different commits can be compared.
+"""
+from __future__ import annotations
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data import Format, clean_crypto_df, detect_outliers_iqr, fill_missing_ohlcv, read_any, to_parquet_bytes
+
+
+def synthetic_ohlcv(
+    rows: int,
+    tickers: int = 10,
+    dup_rate: float = 0.0,
+    gap_rate: float = 0.0,
+    freq: str = "1s",
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Exchange-style OHLCV rows: `tickers` symbols written as BASE/USDT on a shared `freq` grid,
+    prices following a random walk per symbol. A `gap_rate` share of the bars is dropped and a
+    `dup_rate` share of the remaining rows is appended again as duplicates, so the total is
+    about `rows`. Timestamps are epoch milliseconds in `open_time`, interleaved across symbols.
+    """
+    rng = np.random.default_rng(seed)
+    n = max(int(round(rows / (1 + dup_rate))), 1)
+    per_ticker = -(-n // tickers)
+    step_ms = int(pd.Timedelta(freq).total_seconds() * 1000)
+    start_ms = int(pd.Timestamp("2024-01-01", tz="UTC").timestamp() * 1000)
+
+    ts = np.tile(start_ms + np.arange(per_ticker, dtype=np.int64) * step_ms, tickers)[:n]
+    sym = np.repeat(np.arange(tickers), per_ticker)[:n]
+    base = rng.uniform(1, 1000, tickers)[sym]
+    close = base * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    open_ = close * np.exp(rng.normal(0, 5e-4, n))
+    spread = np.abs(rng.normal(0, 1e-3, n)) * close
+    df = pd.DataFrame({
+        "open_time": ts,
+        "symbol": np.array([f"T{i}/USDT" for i in range(tickers)], dtype=object)[sym],
+        "open": open_,
+        "high": np.maximum(open_, close) + spread,
+        "low": np.minimum(open_, close) - spread,
+        "close": close,
+        "volume": rng.exponential(10, n),
+    })
+
+    if gap_rate:
+        df = df[rng.random(n) >= gap_rate]
+    if dup_rate:
+        dups = df.sample(frac=dup_rate, random_state=seed)
+        df = pd.concat([df, dups])
+    # exchanges export in time order, symbols interleaved
+    return df.sort_values(["open_time", "symbol"], kind="mergesort", ignore_index=True)
+
+
+def to_format(df: pd.DataFrame, fmt: Format) -> bytes:
+    if fmt == "csv":
+        return df.to_csv(index=False).encode()
+    if fmt == "json":
+        return df.to_json(orient="records").encode()
+    if fmt == "jsonl":
+        return df.to_json(orient="records", lines=True).encode()
+    if fmt == "parquet":
+        return to_parquet_bytes(df)
+    raise ValueError(f"Unknown format: {fmt!r}")
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class _RssSampler:
+    """Samples resident memory on a background thread and keeps the highest value seen."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> None:
+        rss = _rss_bytes()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "_RssSampler":
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+@dataclass
+class BenchStage:
+    name: str
+    rows: int
+    seconds: float
+    rows_per_s: float
+    rss_before_bytes: Optional[int]
+    peak_rss_bytes: Optional[int]
+
+
+class Bench:
+    """Times stages and records one `BenchStage` each, keeping the best of `repeat` runs."""
+
+    def __init__(self, repeat: int = 1) -> None:
+        self.repeat = repeat
+        self.stages: List[BenchStage] = []
+
+    def run(self, name: str, rows: int, fn: Callable[[], Any]) -> Any:
+        best = None
+        result = None
+        for _ in range(self.repeat):
+            result = None  # release the previous run's output before measuring the next
+            before = _rss_bytes()
+            with _RssSampler() as rss:
+                started = time.perf_counter()
+                result = fn()
+                seconds = time.perf_counter() - started
+            stage = BenchStage(name, rows, seconds, rows / seconds if seconds else float("inf"), before, rss.peak)
+            if best is None or stage.seconds < best.seconds:
+                best = stage
+        self.stages.append(best)
+        return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_benchmark(
+    rows: int,
+    tickers: int = 10,
+    dup_rate: float = 0.01,
+    gap_rate: float = 0.01,
+    fmt: Format = "csv",
+    resample_to: str = "1min",
+    repeat: int = 1,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    raw_df = synthetic_ohlcv(rows, tickers, dup_rate, gap_rate, seed=seed)
+    payload = to_format(raw_df, fmt)
+    n = len(raw_df)
+    del raw_df
+
+    bench = Bench(repeat)
+    filename = f"bench.{fmt}"
+    df = bench.run("read_any", n, lambda: read_any(payload, filename, project=True))
+    # bound rather than closed over, since df is deleted below
+    cleaned, report = bench.run("clean_crypto_df", n, functools.partial(clean_crypto_df, df, resample_to=resample_to))
+    # the stages inside clean_crypto_df, timed by the pipeline itself, without resampling so
+    # that the standalone resample below is measured on the same cleaned input
+    base, base_report = clean_crypto_df(df, outlier_cols=None)
+    del df
+    bench.run("detect_outliers_iqr", len(base), lambda: detect_outliers_iqr(base, ["open", "high", "low", "close", "volume"]))
+    bench.run("fill_missing_ohlcv", len(base), lambda: fill_missing_ohlcv(base, resample_to))
+    bench.run("to_parquet_bytes", len(cleaned), lambda: to_parquet_bytes(cleaned))
+
+    return {
+        "meta": {
+            "rows": n,
+            "tickers": tickers,
+            "dup_rate": dup_rate,
+            "gap_rate": gap_rate,
+            "format": fmt,
+            "input_bytes": len(payload),
+            "resample_to": resample_to,
+            "repeat": repeat,
+            "seed": seed,
+            "commit": _git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "stages": [asdict(s) for s in bench.stages],
+        "pipeline_stages": [asdict(s) for s in base_report.stages],
+        "report": {k: v for k, v in asdict(report).items() if k != "stages"},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning pipeline on synthetic OHLCV data.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--tickers", type=int, default=10)
+    parser.add_argument("--dup-rate", type=float, default=0.01)
+    parser.add_argument("--gap-rate", type=float, default=0.01)
+    parser.add_argument("--format", choices=["csv", "json", "jsonl", "parquet"], default="csv")
+    parser.add_argument("--resample-to", default="1min")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results to this JSON file instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(
+        args.rows, args.tickers, args.dup_rate, args.gap_rate, args.format, args.resample_to, args.repeat, args.seed
+    )
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
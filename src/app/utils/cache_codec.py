@@ -0,0 +1,147 @@
+import json
+import struct
+import zlib
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+# header of every encoded value: magic, serializer id, compressor id, recompute seconds, expiry time.
+# The magic cannot start a JSON document, which tells these values apart from older plain-JSON ones.
+_MAGIC = b"\x00cc"
+_HEADER = struct.Struct("<3sBBdd")
+
+
+@dataclass(frozen=True)
+class Serializer:
+    id: int
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes], Any]
+
+
+@dataclass(frozen=True)
+class Compressor:
+    id: int
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+serializers: dict[str, Serializer] = {}
+compressors: dict[str, Compressor] = {}
+_serializers_by_id: dict[int, Serializer] = {}
+_compressors_by_id: dict[int, Compressor] = {}
+
+
+def register_serializer(name: str, serializer: Serializer) -> None:
+    """Make a serializer available under `name`. Ids are stored with each value and must never be reused."""
+    serializers[name] = serializer
+    _serializers_by_id[serializer.id] = serializer
+
+
+def register_compressor(name: str, compressor: Compressor) -> None:
+    compressors[name] = compressor
+    _compressors_by_id[compressor.id] = compressor
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+register_serializer("json", Serializer(1, _json_dumps, json.loads))
+register_compressor("zlib", Compressor(1, lambda b: zlib.compress(b, 1), zlib.decompress))
+
+try:
+    import orjson
+except ImportError:
+    # orjson output is plain JSON, so values it wrote stay readable without it
+    _serializers_by_id[2] = Serializer(2, _json_dumps, json.loads)
+else:
+    register_serializer("orjson", Serializer(2, orjson.dumps, orjson.loads))
+
+try:
+    import msgpack
+except ImportError:
+    pass
+else:
+    register_serializer("msgpack", Serializer(3, msgpack.packb, lambda b: msgpack.unpackb(b, raw=False)))
+
+try:
+    import zstandard
+except ImportError:
+    pass
+else:
+    _zstd_compressor = zstandard.ZstdCompressor(level=3)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+    register_compressor("zstd", Compressor(2, _zstd_compressor.compress, _zstd_decompressor.decompress))
+
+try:
+    import lz4.frame
+except ImportError:
+    pass
+else:
+    register_compressor("lz4", Compressor(3, lz4.frame.compress, lz4.frame.decompress))
+
+DEFAULT_SERIALIZER = "orjson" if "orjson" in serializers else "json"
+# zlib is always available but costs more CPU per hit than it saves in transfer for most payloads,
+# so it is only used when asked for
+DEFAULT_COMPRESSION = next((c for c in ("zstd", "lz4") if c in compressors), None)
+DEFAULT_COMPRESS_MIN_BYTES = 4096
+
+
+@dataclass(frozen=True)
+class Codec:
+    """
+    Encodes cache values with a serializer and, for payloads of at least `compress_min_bytes`,
+    a compressor. The ids of both are written into each value's header, so any codec decodes
+    any value whatever it was written with.
+    """
+
+    serializer: str = DEFAULT_SERIALIZER
+    compression: str | None = DEFAULT_COMPRESSION
+    compress_min_bytes: int = DEFAULT_COMPRESS_MIN_BYTES
+
+    def __post_init__(self) -> None:
+        if self.serializer not in serializers:
+            raise ValueError(f"Unknown or unavailable cache serializer: {self.serializer!r}")
+        if self.compression is not None and self.compression not in compressors:
+            raise ValueError(f"Unknown or unavailable cache compression: {self.compression!r}")
+
+    def encode(self, data: Any, delta: float, expires_at: float) -> bytes:
+        serializer = serializers[self.serializer]
+        payload = serializer.dumps(data)
+        compressor_id = 0
+        if self.compression is not None and len(payload) >= self.compress_min_bytes:
+            compressor = compressors[self.compression]
+            payload = compressor.compress(payload)
+            compressor_id = compressor.id
+        return _HEADER.pack(_MAGIC, serializer.id, compressor_id, delta, expires_at) + payload
+
+    @staticmethod
+    def decode(raw: bytes) -> tuple[Any, float, float] | None:
+        """
+        (value, recompute seconds, expiry time), or None if `raw` was not written by a codec.
+        Raises ValueError for values that are truncated, corrupt or use an unavailable codec,
+        whatever the compressor or serializer itself raises.
+        """
+        if raw[: len(_MAGIC)] != _MAGIC:
+            return None
+        if len(raw) < _HEADER.size:
+            raise ValueError("Cache value shorter than its header")
+        _, serializer_id, compressor_id, delta, expires_at = _HEADER.unpack_from(raw)
+        payload = memoryview(raw)[_HEADER.size :]
+        if compressor_id:
+            try:
+                compressor = _compressors_by_id[compressor_id]
+            except KeyError:
+                raise ValueError(f"Cache value compressed with unavailable codec id {compressor_id}") from None
+            try:
+                payload = compressor.decompress(payload)
+            except Exception as e:
+                raise ValueError(f"Corrupt compressed cache value: {e}") from e
+        try:
+            serializer = _serializers_by_id[serializer_id]
+        except KeyError:
+            raise ValueError(f"Cache value serialized with unavailable codec id {serializer_id}") from None
+        try:
+            return serializer.loads(bytes(payload)), delta, expires_at
+        except Exception as e:
+            raise ValueError(f"Corrupt cache value: {e}") from e
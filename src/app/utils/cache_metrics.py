@@ -0,0 +1,135 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+COUNTERS = ("hits", "misses", "stale", "invalidations", "evictions", "refreshes")
+
+_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else None}
+
+
+class CacheMetrics:
+    """
+    Per-key-prefix counters and histograms for the cache decorator, kept in process.
+
+    Counters: `hits` (labelled by tier, local or redis), `misses`, `stale` (expired values served
+    while another request refreshes them), `invalidations` (keys and patterns invalidated by
+    mutating requests), `evictions` (entries pushed out of a full local tier) and `refreshes`
+    (keys reloaded by write-through mutations). Histograms: latency of Redis `get` and `set` and
+    of value `serialize`/`deserialize`, plus the size of the values written. Prefixes are the `key_prefix` templates, so label cardinality stays fixed.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, str, str], int] = defaultdict(int)
+        self._timings: dict[tuple[str, str], _Histogram] = {}
+        self._sizes: dict[str, _Histogram] = {}
+
+    def inc(self, prefix: str, counter: str, amount: int = 1, tier: str = "") -> None:
+        with self._lock:
+            self._counters[(prefix, counter, tier)] += amount
+
+    def observe_seconds(self, prefix: str, operation: str, seconds: float) -> None:
+        with self._lock:
+            hist = self._timings.get((prefix, operation))
+            if hist is None:
+                hist = self._timings[(prefix, operation)] = _Histogram(_LATENCY_BUCKETS)
+            hist.observe(seconds)
+
+    def observe_size(self, prefix: str, size: int) -> None:
+        with self._lock:
+            hist = self._sizes.get(prefix)
+            if hist is None:
+                hist = self._sizes[prefix] = _Histogram(_SIZE_BUCKETS)
+            hist.observe(size)
+
+    @contextmanager
+    def timed(self, prefix: str, operation: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_seconds(prefix, operation, time.perf_counter() - started)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Current values per prefix, e.g. `{"{username}_posts_cache:page_{page}": {"hits": 10, "hit_rate": 0.9, ...}}`."""
+        with self._lock:
+            out: dict[str, dict[str, Any]] = defaultdict(lambda: {c: 0 for c in COUNTERS})
+            for (prefix, counter, tier), value in self._counters.items():
+                out[prefix][counter] += value
+                if tier:
+                    out[prefix][f"{counter}_{tier}"] = value
+            for (prefix, operation), hist in self._timings.items():
+                out[prefix][f"{operation}_seconds"] = hist.snapshot()
+            for prefix, hist in self._sizes.items():
+                out[prefix]["value_bytes"] = hist.snapshot()
+        for stats in out.values():
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+        return dict(out)
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            for counter in COUNTERS:
+                lines.append(f"# TYPE cache_{counter}_total counter")
+                for (prefix, name, tier), value in sorted(self._counters.items()):
+                    if name == counter:
+                        labels = {"prefix": prefix, **({"tier": tier} if tier else {})}
+                        lines.append(f"cache_{counter}_total{_labels(labels)} {value}")
+            lines.append("# TYPE cache_operation_seconds histogram")
+            for (prefix, operation), hist in sorted(self._timings.items()):
+                lines += _histogram_lines("cache_operation_seconds", {"prefix": prefix, "operation": operation}, hist)
+            lines.append("# TYPE cache_value_bytes histogram")
+            for prefix, hist in sorted(self._sizes.items()):
+                lines += _histogram_lines("cache_value_bytes", {"prefix": prefix}, hist)
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+            self._sizes.clear()
+
+
+def _labels(labels: dict[str, str]) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _histogram_lines(name: str, labels: dict[str, str], hist: _Histogram) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*hist.buckets, "+Inf"), hist.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': str(bound)})} {cumulative}")
+    lines.append(f"{name}_sum{_labels(labels)} {hist.sum}")
+    lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+    return lines
+
+
+metrics = CacheMetrics()
@@ -1,18 +1,37 @@
+import asyncio
+import fnmatch
 import functools
+import inspect
 import json
+import logging
+import math
+import operator
+import random
 import re
-from collections.abc import Callable
+import string
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
 from typing import Any
 
 from fastapi import Request
 from fastapi.encoders import jsonable_encoder
 from redis.asyncio import ConnectionPool, Redis
+from redis.commands.core import AsyncScript
 
 from ..exceptions.cache_exceptions import CacheIdentificationInferenceError, InvalidRequestError, MissingClientError
+from .cache_codec import Codec
+from .cache_metrics import metrics
 
 pool: ConnectionPool | None = None
 client: Redis | None = None
 
+logger = logging.getLogger(__name__)
+
+# codec for endpoints that do not pass their own
+default_codec = Codec()
+
 
 def _infer_resource_id(kwargs: dict[str, Any], resource_id_type: type | tuple[type, ...]) -> int | str:
     resource_id: int | str | None = None
@@ -32,29 +51,637 @@ def _infer_resource_id(kwargs: dict[str, Any], resource_id_type: type | tuple[ty
 
     return resource_id
 
-def _construct_data_dict(data_inside_brackets: list[str], kwargs: dict[str, Any]) -> dict[str, Any]:
-    data_dict = {}
-    for key in data_inside_brackets:
-        data_dict[key] = kwargs[key]
-    return data_dict
 
+def _could_be(annotation: Any, resource_id_type: type | tuple[type, ...]) -> bool:
+    if not isinstance(annotation, type) or annotation is inspect.Parameter.empty:
+        return True
+    types = resource_id_type if isinstance(resource_id_type, tuple) else (resource_id_type,)
+    return any(issubclass(annotation, t) or issubclass(t, annotation) for t in types)
+
+
+def _compile_resource_id(
+    signature: inspect.Signature, resource_id_name: Any, resource_id_type: type | tuple[type, ...]
+) -> Callable[[dict[str, Any]], Any]:
+    """
+    Accessor for the resource id in an endpoint's keyword arguments. With no `resource_id_name`
+    it returns what `_infer_resource_id` would, but only looks at the parameters that can hold
+    the id: named like an id for `int`, and not annotated with an unrelated type.
+    """
+    if resource_id_name:
+        return operator.itemgetter(resource_id_name)
+
+    params = signature.parameters
+    if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values()):
+        return functools.partial(_infer_resource_id, resource_id_type=resource_id_type)
+
+    if resource_id_type is int:
+        names = [name for name in params if "id" in name]
+    elif resource_id_type is str:
+        names = list(params)
+    else:
+        names = []
+    # the last matching argument wins, as in _infer_resource_id
+    candidates = tuple(reversed([name for name in names if _could_be(params[name].annotation, resource_id_type)]))
+
+    def resource_id(kwargs: dict[str, Any]) -> Any:
+        for name in candidates:
+            value = kwargs.get(name)
+            if isinstance(value, resource_id_type):
+                return value
+        raise CacheIdentificationInferenceError
+
+    return resource_id
+
+
+def _request_param(signature: inspect.Signature) -> str | None:
+    """Name of the endpoint's `Request` parameter, found by annotation since endpoints name it freely."""
+    for name, param in signature.parameters.items():
+        annotation = param.annotation
+        if isinstance(annotation, str):
+            # postponed annotations, e.g. "Request" or "fastapi.Request"
+            if annotation.rsplit(".", 1)[-1] == "Request":
+                return name
+        elif isinstance(annotation, type) and issubclass(annotation, Request):
+            return name
+    return None
+
+
+class _KeyTemplate:
+    """A key template with `{name}` placeholders for endpoint arguments, checked once when the endpoint is decorated."""
+
+    __slots__ = ("template", "fields", "render")
+
+    def __init__(self, template: str, signature: inspect.Signature) -> None:
+        self.template = template
+        self.fields = tuple(
+            dict.fromkeys(re.split(r"[.\[]", name, maxsplit=1)[0] for _, name, _, _ in string.Formatter().parse(template) if name)
+        )
+        params = signature.parameters
+        if not any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values()):
+            missing = [name for name in self.fields if name not in params]
+            if missing:
+                raise ValueError(f"Cache key template {template!r} uses unknown arguments: {', '.join(missing)}")
+        self.render: Callable[[dict[str, Any]], str] = template.format_map if self.fields else lambda kwargs: template
+
+    def parser(self) -> re.Pattern[str]:
+        """Regex recovering the arguments from a rendered key; only plain `{name}` fields can be parsed back."""
+        parts: list[str] = []
+        seen: set[str] = set()
+        for literal, name, spec, conversion in string.Formatter().parse(self.template):
+            parts.append(re.escape(literal))
+            if name is None:
+                continue
+            if spec or conversion or not name.isidentifier():
+                raise ValueError(f"Cache key template {self.template!r} cannot be parsed back into arguments")
+            parts.append(f"(?P={name})" if name in seen else f"(?P<{name}>.+?)")
+            seen.add(name)
+        return re.compile("".join(parts))
+
+
+_TAG_PREFIX = "cache-tag:"
+_TAG_DELETE_BATCH = 500
+_GLOB_CHARS = re.compile(r"[*?\[\]\\]")
+
+# pops a tag set atomically, so keys registered while its members are deleted go to a new set
+_POP_TAG = """
+local members = redis.call("smembers", KEYS[1])
+redis.call("del", KEYS[1])
+return members
+"""
+
+# registers a key in its tag sets; a tag's TTL is only ever extended, so it outlives every member
+_REGISTER_TAGS = """
+local ttl = tonumber(ARGV[2])
+for _, tag in ipairs(KEYS) do
+    redis.call("sadd", tag, ARGV[1])
+    if redis.call("ttl", tag) < ttl then
+        redis.call("expire", tag, ttl)
+    end
+end
+"""
+
+# the Lua scripts registered on `client`, redone when the client is replaced
+_scripts: dict[str, AsyncScript] = {}
+_scripts_client: Redis | None = None
+
+
+def _script(source: str) -> AsyncScript:
+    """`source` registered on the current client; it runs with EVALSHA, loading the script again if the server lost it."""
+    global _scripts_client
+    if _scripts_client is not client:
+        _scripts.clear()
+        _scripts_client = client
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = client.register_script(source)
+    return script
+
+
+def _tags_for_key(cache_key: str) -> list[str]:
+    """Tag sets a key is registered in: one per prefix of the key ending in ':'."""
+    return [_TAG_PREFIX + cache_key[: i + 1] for i, c in enumerate(cache_key) if c == ":"]
+
+
+def _tag_for_pattern(pattern: str) -> str | None:
+    """The tag set holding exactly the keys matching `pattern`, for patterns of the form `<prefix>:*`."""
+    # the decorator appends '*' to configured patterns, so `x:*` arrives as `x:**`
+    head = pattern.rstrip("*")
+    if pattern.endswith("*") and head.endswith(":") and not _GLOB_CHARS.search(head):
+        return _TAG_PREFIX + head
+    return None
+
+
+async def _store_with_tags(cache_key: str, value: str, ttl: int) -> None:
+    if client is None:
+        return
+    pipe = client.pipeline(transaction=False)
+    pipe.set(cache_key, value, ex=ttl)
+    tags = _tags_for_key(cache_key)
+    if tags:
+        await _script(_REGISTER_TAGS)(keys=tags, args=[cache_key, ttl], client=pipe)
+    await pipe.execute()
+
+
+async def _delete_keys_by_pattern(pattern: str) -> list[bytes | str]:
+    """
+    Delete the keys matching `pattern` and return them. Patterns of the form `<prefix>:*` are
+    resolved through the tag set every cached key is registered in, costing O(keys deleted) and
+    never touching the rest of the keyspace; any other pattern falls back to walking the
+    keyspace with SCAN.
+    """
+    if client is None:
+        return []
+
+    tag = _tag_for_pattern(pattern)
+    if tag is not None:
+        members = await _script(_POP_TAG)(keys=[tag])
+        for i in range(0, len(members), _TAG_DELETE_BATCH):
+            await client.delete(*members[i : i + _TAG_DELETE_BATCH])
+        return list(members)
+
+    deleted: list[bytes | str] = []
+    cursor = 0
+    while True:
+        cursor, keys = await client.scan(cursor, match=pattern, count=100)
+        if keys:
+            await client.delete(*keys)
+            deleted += keys
+        if cursor == 0:
+            break
+    return deleted
+
+
+# marks values written by `cache` before values went through `Codec`; still readable
+_ENVELOPE_TAG = "_cache_v1"
+_LOCK_SUFFIX = ":lock"
+_LOCK_POLL_SECONDS = 0.05
+
+# deletes the lock only if it still holds our token, so a holder whose lock expired
+# cannot release the lock of the request that took over
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _pack(data: Any, delta: float, expiration: int, codec: Codec) -> bytes:
+    return codec.encode(data, delta, time.time() + expiration)
+
+
+def _unpack(raw: bytes) -> tuple[Any, float, float] | None:
+    """
+    (value, recompute seconds, expiry time) of a cached entry, or None if it cannot be decoded
+    here, e.g. because it was written with a codec this worker lacks. Plain JSON entries written
+    by older versions never expire early.
+    """
+    try:
+        decoded = Codec.decode(raw)
+        if decoded is not None:
+            return decoded
+        data = json.loads(raw.decode())
+        if isinstance(data, dict) and data.get(_ENVELOPE_TAG):
+            return data["value"], float(data["delta"]), float(data["expires_at"])
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Ignoring undecodable cache entry")
+        return None
+    return data, 0.0, math.inf
+
+
+def _is_fresh(delta: float, expires_at: float, beta: float) -> bool:
+    """
+    XFetch: an entry is recomputed before it expires with a probability that grows as expiry
+    nears and with the time the value took to compute, so that one request refreshes it ahead
+    of the crowd instead of all of them missing together. `beta` 0 disables early refresh.
+    """
+    now = time.time()
+    if beta > 0 and delta > 0:
+        now -= delta * beta * math.log(1.0 - random.random())
+    return now < expires_at
+
+
+async def _wait_for_refresh(cache_key: str, timeout: float) -> tuple[Any, float, float] | None:
+    if client is None:
+        return None
+    lock_key = cache_key + _LOCK_SUFFIX
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_LOCK_POLL_SECONDS)
+        raw = await client.get(cache_key)
+        entry = _unpack(raw) if raw is not None else None
+        if entry is not None and _is_fresh(entry[1], entry[2], 0.0):
+            return entry
+        if not await client.exists(lock_key):
+            # the holder gave up without writing a value
+            return None
+    return None
+
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+_MISS = object()
+
+
+class _LocalCache:
+    """Bounded in-process LRU of decoded values, each with its own deadline."""
+
+    def __init__(self, prefix: str, max_entries: int, ttl: float) -> None:
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISS
+        deadline, value = entry
+        if time.monotonic() >= deadline:
+            del self._entries[key]
+            return _MISS
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + min(ttl, self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.inc(self.prefix, "evictions")
+
+    def evict(self, keys: Iterable[str], patterns: Iterable[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+        for pattern in patterns:
+            for key in [k for k in self._entries if fnmatch.fnmatchcase(k, pattern)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# one local tier per key prefix, configured by the first `cache` decorator using that prefix
+_local_caches: dict[str, _LocalCache] = {}
+invalidation_listener: asyncio.Task | None = None
+# local tiers are only consulted while this worker receives invalidations from the others
+_listening = False
+
+
+def _evict_local(keys: list[str], patterns: list[str]) -> None:
+    for local in _local_caches.values():
+        local.evict(keys, patterns)
+
+
+async def _publish_invalidation(keys: list[str], patterns: list[str]) -> None:
+    _evict_local(keys, patterns)
+    if client is not None and _local_caches:
+        await client.publish(INVALIDATION_CHANNEL, json.dumps({"keys": keys, "patterns": patterns}))
+
+
+async def listen_for_invalidations(retry_seconds: float = 1.0) -> None:
+    """
+    Apply the invalidations published by every worker to this worker's local tiers. Runs until
+    cancelled, resubscribing after connection errors; local tiers are cleared on every
+    (re)subscription and bypassed while unsubscribed, since invalidations may have been missed.
+    """
+    global _listening
+    while True:
+        pubsub = None
+        try:
+            if client is None:
+                raise MissingClientError
+            pubsub = client.pubsub()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            for local in _local_caches.values():
+                local.clear()
+            _listening = True
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                data = json.loads(message["data"])
+                _evict_local(data.get("keys", []), data.get("patterns", []))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Cache invalidation listener failed; retrying in %ss", retry_seconds)
+        finally:
+            _listening = False
+            if pubsub is not None:
+                await pubsub.aclose()
+        await asyncio.sleep(retry_seconds)
+
+
+class _Loader:
+    """Read-through loader of the keys of one GET endpoint, used to refresh them after mutations."""
+
+    def __init__(
+        self, key_template: str, resource_id_name: str, func: Callable[..., Awaitable[Any]], expiration: int, stale_ttl: int, codec: Codec | None
+    ) -> None:
+        signature = inspect.signature(func)
+        self.parser = _KeyTemplate(f"{key_template}:{{{resource_id_name}}}", signature).parser()
+        self.func = func
+        self.converters = {
+            name: param.annotation
+            for name, param in signature.parameters.items()
+            if param.annotation in (int, float, str)
+        }
+        self.expiration = expiration
+        self.stale_ttl = stale_ttl
+        self.codec = codec
+
+    def arguments(self, key: str) -> dict[str, Any] | None:
+        match = self.parser.fullmatch(key)
+        if match is None:
+            return None
+        kwargs: dict[str, Any] = match.groupdict()
+        try:
+            for name, convert in self.converters.items():
+                if name in kwargs:
+                    kwargs[name] = convert(kwargs[name])
+        except ValueError:
+            return None
+        return kwargs
+
+    async def refresh(self, key: str, kwargs: dict[str, Any]) -> None:
+        """Recompute and store `key`; a loader returning None leaves it uncached."""
+        started = time.perf_counter()
+        value = await self.func(**kwargs)
+        if value is None:
+            await client.delete(key)
+            return
+        delta = time.perf_counter() - started
+        packed = _pack(jsonable_encoder(value), delta, self.expiration, self.codec or default_codec)
+        await _store_with_tags(key, packed, self.expiration + self.stale_ttl)
+
+
+# read-through loaders by key template, registered by the GET endpoints that declare one
+_loaders: dict[str, _Loader] = {}
+# background refreshes in flight, referenced so they are not garbage collected mid-run
+_refresh_tasks: set[asyncio.Task] = set()
+
+
+def _loader_for(key: str) -> tuple[_Loader, dict[str, Any]] | None:
+    for loader in _loaders.values():
+        kwargs = loader.arguments(key)
+        if kwargs is not None:
+            return loader, kwargs
+    return None
+
+
+async def _refresh_keys(keys: Iterable[str]) -> int:
+    """Reload the given keys that have a registered loader, one at a time; returns how many were reloaded."""
+    refreshed = 0
+    for key in keys:
+        found = _loader_for(key)
+        if found is None:
+            continue
+        loader, kwargs = found
+        try:
+            await loader.refresh(key, kwargs)
+        except Exception:
+            logger.exception("Refreshing cache key %s failed", key)
+            continue
+        refreshed += 1
+    return refreshed
+
+
+def _refresh_in_background(key_prefix: str, keys: list[str]) -> None:
+    async def run() -> None:
+        metrics.inc(key_prefix, "refreshes", await _refresh_keys(keys))
+
+    task = asyncio.create_task(run())
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+def cache(
+    key_prefix: str,
+    resource_id_name: Any = None,
+    expiration: int = 3600,
+    resource_id_type: type | tuple[type, ...] = int,
+    to_invalidate_extra: dict[str, Any] | None = None,
+    pattern_to_invalidate_extra: list[str] | None = None,
+    stale_ttl: int = 30,
+    lock_timeout: float = 10.0,
+    early_refresh_beta: float = 0.0,
+    local_ttl: float = 0.0,
+    local_max_entries: int = 1024,
+    codec: Codec | None = None,
+    loader: Callable[..., Awaitable[Any]] | None = None,
+    write_through: bool = False,
+) -> Callable:
+    """
+    Cache decorator for FastAPI endpoints.
+
+    GET responses are cached in Redis under `{key_prefix}:{resource_id}`, where `key_prefix` may
+    use the endpoint's arguments as `{name}` placeholders. Any other method invalidates that key,
+    the keys in `to_invalidate_extra` and the keys matching `pattern_to_invalidate_extra`.
+    Every cached key is registered in a tag set per ':'-terminated prefix, so patterns such as
+    `"{username}_posts_cache:*"` are invalidated from the tag set instead of by scanning.
+
+    Misses are single-flight: the request that finds a missing or expired entry takes a short
+    Redis lock (at most `lock_timeout` seconds) and recomputes; concurrent requests get the
+    expired value, which is kept `stale_ttl` seconds past `expiration` for this purpose, or wait
+    for the recomputed one if there is none. If the lock holder fails, a waiter computes the
+    value itself. With `early_refresh_beta` > 0 entries are also refreshed ahead of expiry
+    (XFetch); 1.0 is the usual setting, larger values refresh earlier.
+
+    With `local_ttl` > 0, decoded values are also kept in an in-process LRU of up to
+    `local_max_entries` entries for this key prefix, for at most `local_ttl` seconds and never
+    past their Redis expiry. Invalidations are published on `INVALIDATION_CHANNEL` and applied
+    by `listen_for_invalidations` in every worker; without a running listener the local tier
+    is bypassed. A read racing an invalidation on another worker may keep the old value
+    locally for up to `local_ttl`, so keep it short.
+
+    With `loader`, a GET endpoint declares how to compute its value outside a request: an async
+    function taking the key's arguments by name (opening its own database session) and
+    returning the value, or None if there is none. A mutation decorated with `write_through`
+    then reloads its own key through the matching loader before responding, instead of only
+    deleting it, and reloads the other keys it invalidates in a background task. Keys without
+    a loader are just invalidated. Refreshes are best effort: a refresh racing a later
+    mutation of the same key may store the older value until it expires.
+
+    Parameters
+    ----------
+    key_prefix: str
+        A unique prefix to identify the cache key.
+    resource_id_name: Any, optional
+        Name of the argument holding the resource id; inferred from `resource_id_type` when None.
+    expiration: int, optional
+        Seconds before a cached value is recomputed. Defaults to 3600.
+    resource_id_type: type | tuple[type, ...], default int
+        Type of the resource id, used when inferring it.
+    to_invalidate_extra: dict[str, Any] | None, optional
+        Further `{prefix: id template}` keys to delete on non-GET requests.
+    pattern_to_invalidate_extra: list[str] | None, optional
+        Key patterns to delete on non-GET requests, e.g. `"{username}_posts_cache:*"`.
+    stale_ttl: int, optional
+        Seconds an expired value may still be served while another request recomputes it.
+    lock_timeout: float, optional
+        Seconds the recompute lock is held at most, and waiters wait at most.
+    early_refresh_beta: float, optional
+        XFetch weight; 0 disables early refresh.
+    local_ttl: float, optional
+        Seconds a value may be served from the in-process tier; 0 disables it.
+    local_max_entries: int, optional
+        Size of the in-process tier for this key prefix.
+    codec: Codec | None, optional
+        Serializer and compression for the values written; `default_codec` when None. Values
+        carry their format, so changing it does not invalidate existing entries.
+    loader: Callable[..., Awaitable[Any]] | None, optional
+        Read-through loader for this endpoint's keys, used by write-through mutations. Its
+        parameters must cover the key's placeholders and `resource_id_name`, which is required.
+    write_through: bool, optional
+        Refresh the invalidated keys through their loaders instead of leaving them cold.
+
+    Hits (by tier), misses, stale serves, invalidations, local evictions, operation latencies
+    and value sizes are recorded per `key_prefix` in `cache_metrics.metrics`.
+
+    Returns
+    -------
+    Callable
+        The decorated endpoint.
+
+    Raises
+    ------
+    ValueError
+        When decorating, if the endpoint has no `Request` parameter, a key template names an
+        argument the endpoint or the loader does not have, or a loader is given without
+        `resource_id_name`.
+    InvalidRequestError
+        If a GET endpoint is given keys to invalidate.
+    MissingClientError
+        If the Redis client is not initialized.
+    """
+
+    local = _local_caches.setdefault(key_prefix, _LocalCache(key_prefix, local_max_entries, local_ttl)) if local_ttl > 0 else None
+
+    if loader is not None:
+        if not resource_id_name:
+            raise ValueError("A cache loader needs resource_id_name to recover the resource id from keys")
+        _loaders[key_prefix] = _Loader(key_prefix, resource_id_name, loader, expiration, stale_ttl, codec)
+
+    def wrapper(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        request_name = _request_param(signature)
+        if request_name is None:
+            raise ValueError(f"Cached endpoint {func.__qualname__} has no parameter annotated with Request")
+        resource_id_of = _compile_resource_id(signature, resource_id_name, resource_id_type)
+        key_template = _KeyTemplate(key_prefix, signature)
+        extra_keys = [
+            (_KeyTemplate(prefix, signature), _KeyTemplate(id_template, signature).fields[0])
+            for prefix, id_template in (to_invalidate_extra or {}).items()
+        ]
+        pattern_templates = [_KeyTemplate(pattern, signature) for pattern in pattern_to_invalidate_extra or ()]
+
+        @functools.wraps(func)
+        async def inner(*args: Any, **kwargs: Any) -> Any:
+            if client is None:
+                raise MissingClientError
+
+            # FastAPI passes every argument by keyword, under whatever name the endpoint gave it
+            request = kwargs[request_name] if request_name in kwargs else args[0]
+
+            cache_key = f"{key_template.render(kwargs)}:{resource_id_of(kwargs)}"
 
-def _format_prefix(prefix: str, kwargs: dict[str, Any]) -> str:
+            if request.method != "GET":
+                result = await func(*args, **kwargs)
+                extra = [f"{prefix.render(kwargs)}:{kwargs[id_name]}" for prefix, id_name in extra_keys]
+                keys = [cache_key, *extra]
+                patterns = [pattern.render(kwargs) + "*" for pattern in pattern_templates]
+                if write_through and await _refresh_keys([cache_key]):
+                    metrics.inc(key_prefix, "refreshes")
+                else:
+                    await client.delete(cache_key)
+                if extra:
+                    await client.delete(*extra)
+                invalidated = list(extra)
+                for pattern in patterns:
+                    invalidated += [k.decode() if isinstance(k, bytes) else k for k in await _delete_keys_by_pattern(pattern)]
+                await _publish_invalidation(keys, patterns)
+                metrics.inc(key_prefix, "invalidations", len(keys) + len(patterns))
+                if write_through and invalidated:
+                    _refresh_in_background(key_prefix, invalidated)
+                return result
 
-    data_inside_brackets = _extract_data_inside_brackets(prefix)
-    data_dict = _construct_data_dict(data_inside_brackets, kwargs)
-    formatted_prefix = prefix.format(**data_dict)
-    return formatted_prefix
+            if to_invalidate_extra is not None or pattern_to_invalidate_extra is not None:
+                raise InvalidRequestError
 
-def _format_extra_data(to_invalidate_extra: dict[str, str], kwargs: dict[str, Any]) -> dict[str, Any]:
+            use_local = local is not None and _listening
+            if use_local:
+                value = local.get(cache_key)
+                if value is not _MISS:
+                    metrics.inc(key_prefix, "hits", tier="local")
+                    return value
 
-    formatted_extra = {}
-    for prefix, id_template in to_invalidate_extra.items():
-        formatted_prefix = _format_prefix(prefix, kwargs)
-        id = _extract_data_inside_brackets(id_template)[0]
-        formatted_extra[formatted_prefix] = kwargs[id]
+            with metrics.timed(key_prefix, "get"):
+                raw = await client.get(cache_key)
+            entry = None
+            if raw is not None:
+                with metrics.timed(key_prefix, "deserialize"):
+                    entry = _unpack(raw)
+            stale = None
+            if entry is not None:
+                value, delta, expires_at = entry
+                if _is_fresh(delta, expires_at, early_refresh_beta):
+                    metrics.inc(key_prefix, "hits", tier="redis")
+                    if use_local:
+                        local.set(cache_key, value, expires_at - time.time())
+                    return value
+                stale = value
 
-    return formatted_extra
+            lock_key = cache_key + _LOCK_SUFFIX
+            token = uuid.uuid4().hex
+            locked = await client.set(lock_key, token, nx=True, px=int(lock_timeout * 1000))
+            if not locked:
+                if stale is not None:
+                    metrics.inc(key_prefix, "stale")
+                    return stale
+                entry = await _wait_for_refresh(cache_key, lock_timeout)
+                if entry is not None:
+                    metrics.inc(key_prefix, "hits", tier="redis")
+                    return entry[0]
 
+            metrics.inc(key_prefix, "misses")
+            try:
+                started = time.perf_counter()
+                result = await func(*args, **kwargs)
+                delta = time.perf_counter() - started
+                with metrics.timed(key_prefix, "serialize"):
+                    serializable_data = jsonable_encoder(result)
+                    packed = _pack(serializable_data, delta, expiration, codec or default_codec)
+                metrics.observe_size(key_prefix, len(packed))
+                with metrics.timed(key_prefix, "set"):
+                    await _store_with_tags(cache_key, packed, expiration + stale_ttl)
+                if use_local:
+                    local.set(cache_key, serializable_data, expiration)
+            finally:
+                if locked:
+                    await _script(_RELEASE_LOCK)(keys=[lock_key], args=[token])
+            return result
 
+        return inner
 
+    return wrapper
@@ -0,0 +1,89 @@
+from __future__ import annotations
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional
+
+from .data import CleanReport, StageStats, clean_crypto_df, read_any, write_parquet
+
+# progress records outlive the job result a little, so a finished job still shows all its stages
+PROGRESS_TTL_SECONDS = 2 * 3600
+
+
+def job_dir(directory: Optional[str] = None) -> str:
+    """Directory shared by the API and the workers for spooled uploads and job results."""
+    path = directory or os.path.join(tempfile.gettempdir(), "crypto-clean-jobs")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def upload_path(directory: str, job_id: str) -> str:
+    return os.path.join(directory, f"{job_id}.upload")
+
+
+def result_path(directory: str, job_id: str) -> str:
+    return os.path.join(directory, f"{job_id}.parquet")
+
+
+def progress_key(job_id: str) -> str:
+    return f"clean-progress:{job_id}"
+
+
+def planned_stages(options: Dict[str, Any]) -> List[str]:
+    """Names of the stages a job with these `clean_crypto_df` options goes through, in order."""
+    stages = ["read", "standardize_columns", "coerce_datetime", "coerce_numeric", "normalize_tickers", "drop_dupes"]
+    if options.get("outlier_cols", True):
+        stages.append("detect_outliers_iqr")
+    if options.get("resample_to"):
+        stages.append("fill_missing_ohlcv")
+    stages.append("write")
+    return stages
+
+
+def progress_record(planned: List[str], done: List[StageStats]) -> str:
+    return json.dumps({
+        "stages_total": len(planned),
+        "stages_done": len(done),
+        "current": planned[len(done)] if len(done) < len(planned) else None,
+        "stages": [asdict(s) for s in done],
+    })
+
+
+def run_clean_job(
+    source: str,
+    filename: str,
+    target: str,
+    options: Dict[str, Any],
+    on_stage: Optional[Callable[[StageStats], None]] = None,
+) -> CleanReport:
+    """Clean the spooled upload at `source` and write the result parquet to `target`, reporting every stage to `on_stage`."""
+    on_stage = on_stage or (lambda stats: None)
+
+    started = time.perf_counter()
+    with open(source, "rb") as f:
+        df = read_any(f.read(), filename, project=True)
+    on_stage(StageStats("read", time.perf_counter() - started, int(df.memory_usage(index=True).sum())))
+
+    cleaned, report = clean_crypto_df(df, copy=False, on_stage=on_stage, **options)
+    del df
+
+    started = time.perf_counter()
+    tmp = target + ".tmp"
+    write_parquet([cleaned], tmp)
+    os.replace(tmp, target)
+    on_stage(StageStats("write", time.perf_counter() - started, int(cleaned.memory_usage(index=True).sum())))
+    return report
+
+
+def sweep_results(directory: str, max_age: float) -> None:
+    """Remove job results and leftover uploads older than `max_age` seconds."""
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
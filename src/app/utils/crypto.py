@@ -1,12 +1,73 @@
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Literal
-from utils.file_utils import read_any, clean_crypto_df, to_parquet_bytes
+from sqlalchemy.orm import Session
+from typing import Any, Callable, Iterator, List, Optional, Dict, Literal, Tuple
+from dataclasses import asdict
+from config import DataProcessingSettings
+from crud.partition import sync_partitions
+from database import get_db
+from utils.data import (
+    CleanReport,
+    ParquetCodec,
+    ParquetWriteOptions,
+    combine_reports,
+    is_archive,
+    iter_archive,
+    read_any,
+    iter_any,
+    iter_parquet_bytes,
+    write_parquet,
+)
+from utils.dataset import DatasetStore, PartitionStats, dataset_dir
+from utils.executor import (
+    CleaningExecutor,
+    ExecutorSaturatedError,
+    JobTimeoutError,
+    clean_bytes,
+    clean_bytes_to_file,
+)
+from utils.result_cache import ResultCache, preview_parquet, result_key
+from utils.stream import clean_crypto_stream
+import asyncio
+import functools
 import json
+import os
+import tarfile
+import tempfile
+import zipfile
 import httpx
+import pandas as pd
+
+processing_settings = DataProcessingSettings()
+executor = CleaningExecutor(
+    kind=processing_settings.CLEAN_EXECUTOR_KIND,
+    max_workers=processing_settings.CLEAN_EXECUTOR_WORKERS,
+    max_pending=processing_settings.CLEAN_EXECUTOR_MAX_PENDING,
+    timeout=processing_settings.CLEAN_JOB_TIMEOUT_SECONDS,
+    retry_after=processing_settings.CLEAN_RETRY_AFTER_SECONDS,
+)
+result_cache = (
+    ResultCache(
+        processing_settings.CLEAN_CACHE_DIR,
+        processing_settings.CLEAN_CACHE_MAX_BYTES,
+        redis_url=processing_settings.CLEAN_CACHE_REDIS_URL,
+    )
+    if processing_settings.CLEAN_CACHE_DIR
+    else None
+)
+
+dataset_store = DatasetStore(dataset_dir(processing_settings.CLEAN_DATASET_DIR))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    executor.shutdown(wait=False)
 
-app = FastAPI(title="Crypto Data Processor API", version="0.2.0")
+
+app = FastAPI(title="Crypto Data Processor API", version="0.2.0", lifespan=lifespan)
 
 
 class CleaningOptions(BaseModel):
@@ -16,6 +77,165 @@ class CleaningOptions(BaseModel):
     ticker_mapping: Optional[Dict[str, str]] = None
 
 
+def _upload_size(uploaded_file: UploadFile) -> int:
+    if uploaded_file.size is not None:
+        return uploaded_file.size
+    uploaded_file.file.seek(0, os.SEEK_END)
+    size = uploaded_file.file.tell()
+    uploaded_file.file.seek(0)
+    return size
+
+
+def _should_stream(uploaded_file: UploadFile, stream: Optional[bool]) -> bool:
+    if stream is not None:
+        return stream
+    return _upload_size(uploaded_file) > processing_settings.CLEAN_STREAM_THRESHOLD_BYTES
+
+
+async def _offload(submit: Callable[..., Any], fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    try:
+        return await submit(fn, *args, **kwargs)
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except JobTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+def _stream_clean(
+    uploaded_file: UploadFile,
+    ticker_map: Optional[Dict[str, str]],
+    pair_separator: Optional[str],
+    resample_interval: Optional[str],
+    fill_method: str,
+):
+    uploaded_file.file.seek(0)
+    chunks = iter_any(
+        uploaded_file.file, uploaded_file.filename, processing_settings.CLEAN_STREAM_CHUNK_ROWS, project=True
+    )
+    return clean_crypto_stream(
+        chunks,
+        symbol_map=ticker_map,
+        base_quote_sep=pair_separator or None,
+        resample_to=resample_interval,
+        freq_fill=fill_method,
+        reservoir_size=processing_settings.CLEAN_STREAM_RESERVOIR_SIZE,
+        reservoir_budget=processing_settings.CLEAN_STREAM_RESERVOIR_BUDGET,
+        spool_dir=processing_settings.CLEAN_STREAM_SPOOL_DIR,
+    )
+
+
+def _stream_preview(uploaded_file: UploadFile, *args) -> tuple:
+    outputs, cleaner = _stream_clean(uploaded_file, *args)
+    preview_data = []
+    for out in outputs:
+        if len(preview_data) < 10:
+            preview_data.extend(out.head(10 - len(preview_data)).to_dict(orient="records"))
+    return preview_data, cleaner.report
+
+
+def _stream_into_cache(key: str, uploaded_file: UploadFile, *args) -> Tuple[str, CleanReport]:
+    staged = result_cache.staging_path(key)
+    try:
+        report = _stream_to_file(uploaded_file, staged, ParquetWriteOptions(), *args)
+    except BaseException:
+        if os.path.exists(staged):
+            os.remove(staged)
+        raise
+    return result_cache.commit(key, staged, report), report
+
+
+_FILE_CHUNK = 1024 * 1024
+
+
+def _discard(path: str) -> None:
+    with suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def _iter_file(f, delete: bool = False):
+    try:
+        while chunk := f.read(_FILE_CHUNK):
+            yield chunk
+    finally:
+        f.close()
+        if delete:
+            os.remove(f.name)
+
+
+def _iter_cached_parquet(path: str, write_options: ParquetWriteOptions):
+    # cache entries are written with the default options; anything else is re-encoded batch by batch
+    if write_options == ParquetWriteOptions():
+        return _iter_file(open(path, "rb"))
+    import pyarrow.parquet as pq
+
+    return iter_parquet_bytes(pq.ParquetFile(path).iter_batches(batch_size=write_options.row_group_size), write_options)
+
+
+def _stream_to_file(uploaded_file: UploadFile, path: str, write_options: ParquetWriteOptions, *args) -> CleanReport:
+    outputs, cleaner = _stream_clean(uploaded_file, *args)
+    write_parquet(outputs, path, write_options)
+    return cleaner.report
+
+
+def _parquet_response(body, filename: Optional[str]) -> StreamingResponse:
+    stem = os.path.splitext(os.path.basename(filename or "cleaned"))[0]
+    return StreamingResponse(
+        body,
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f'attachment; filename="{stem}.parquet"'},
+    )
+
+
+def _clean_options(
+    ticker_map: Optional[Dict[str, str]], pair_separator: Optional[str], resample_interval: Optional[str], fill_method: str
+) -> Dict[str, Any]:
+    return dict(
+        symbol_map=ticker_map,
+        base_quote_sep=pair_separator or None,
+        resample_to=resample_interval,
+        freq_fill=fill_method,
+    )
+
+
+async def _cached_clean(
+    uploaded_file: UploadFile,
+    stream: Optional[bool],
+    ticker_map: Optional[Dict[str, str]],
+    pair_separator: Optional[str],
+    resample_interval: Optional[str],
+    fill_method: str,
+) -> Tuple[str, CleanReport]:
+    """Path of the cleaned parquet and its report, from the result cache or by cleaning and storing it."""
+    options = _clean_options(ticker_map, pair_separator, resample_interval, fill_method)
+    # hashing and cache lookups bypass the executor, so hits are served even when it is saturated
+    key = await asyncio.to_thread(result_key, uploaded_file.file, options)
+    hit = await asyncio.to_thread(result_cache.get, key)
+    if hit is not None:
+        return hit
+
+    if _should_stream(uploaded_file, stream):
+        return await _offload(
+            executor.run_local, _stream_into_cache, key, uploaded_file, ticker_map, pair_separator, resample_interval, fill_method
+        )
+    raw_content = await uploaded_file.read()
+    staged = result_cache.staging_path(key)
+    try:
+        report = await _offload(
+            executor.run,
+            clean_bytes_to_file,
+            raw_content,
+            uploaded_file.filename,
+            staged,
+            on_abandon=functools.partial(_discard, staged),
+            **options,
+        )
+    except BaseException:
+        _discard(staged)
+        raise
+    path = await asyncio.to_thread(result_cache.commit, key, staged, report)
+    return path, report
+
+
 @app.post("/process/clean")
 async def clean_uploaded_file(
     uploaded_file: UploadFile = File(...),
@@ -23,22 +243,127 @@ async def clean_uploaded_file(
     pair_separator: Optional[str] = Form('/'),
     fill_method: str = Form('ffill'),
     ticker_map_json: Optional[str] = Form(None),
+    stream: Optional[bool] = Form(None),
 ):
-    raw_content = await uploaded_file.read()
-    df = read_any(raw_content, uploaded_file.filename)
     ticker_map = json.loads(ticker_map_json) if ticker_map_json else None
+    if result_cache is not None:
+        path, summary = await _cached_clean(uploaded_file, stream, ticker_map, pair_separator, resample_interval, fill_method)
+        return JSONResponse({"summary": asdict(summary), "preview": preview_parquet(path)})
 
-    cleaned_df, summary = clean_crypto_df(
-        df,
-        symbol_map=ticker_map,
-        base_quote_sep=pair_separator or None,
-        resample_to=resample_interval,
-        freq_fill=fill_method,
+    if _should_stream(uploaded_file, stream):
+        # the upload file handle cannot be sent to another process, so streaming runs on a local thread
+        preview_data, summary = await _offload(
+            executor.run_local, _stream_preview, uploaded_file, ticker_map, pair_separator, resample_interval, fill_method
+        )
+        return JSONResponse({"summary": asdict(summary), "preview": preview_data})
+
+    raw_content = await uploaded_file.read()
+    preview_data, summary = await _offload(
+        executor.run,
+        clean_bytes,
+        raw_content,
+        uploaded_file.filename,
+        **_clean_options(ticker_map, pair_separator, resample_interval, fill_method),
     )
 
-    preview_data = cleaned_df.head(10).to_dict(orient="records")
+    return JSONResponse({"summary": asdict(summary), "preview": preview_data})
+
 
-    return JSONResponse({"summary": summary.__dict__, "preview": preview_data})
+def _batch_members(uploaded_files: List[UploadFile]) -> Iterator[Tuple[str, bytes]]:
+    for uploaded_file in uploaded_files:
+        if is_archive(uploaded_file.filename):
+            for name, content in iter_archive(uploaded_file.file, uploaded_file.filename):
+                yield f"{uploaded_file.filename}/{name}", content
+        else:
+            yield uploaded_file.filename, uploaded_file.file.read()
+
+
+def _store_cleaned(path: str) -> List[PartitionStats]:
+    return dataset_store.write(pd.read_parquet(path))
+
+
+@app.post("/process/clean/batch")
+async def clean_uploaded_batch(
+    uploaded_files: List[UploadFile] = File(...),
+    pair_separator: Optional[str] = Form('/'),
+    ticker_map_json: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Clean many files, or the files inside zip/tar archives, in parallel on the executor and merge
+    them into the partitioned dataset store, updating the partition rows. Rows are stored at their
+    original resolution, so there is no resampling here. A file that cannot be cleaned, including
+    one refused by a saturated executor or timed out, is reported with its error and status and
+    does not fail the batch; the files that were stored are reported either way. Only when the
+    executor refused every file does the batch fail with 503.
+    """
+    ticker_map = json.loads(ticker_map_json) if ticker_map_json else None
+    options = dict(symbol_map=ticker_map, base_quote_sep=pair_separator or None)
+    # one job per worker at a time: the batch keeps the pool busy without hitting its admission
+    # limit, and only that many files are held in memory
+    slots = asyncio.Semaphore(executor.max_workers)
+
+    async def clean_one(name: str, content: bytes) -> Dict[str, Any]:
+        fd, path = tempfile.mkstemp(suffix=".parquet", dir=processing_settings.CLEAN_STREAM_SPOOL_DIR)
+        os.close(fd)
+        try:
+            try:
+                report = await _offload(
+                    executor.run, clean_bytes_to_file, content, name, path, on_abandon=functools.partial(_discard, path), **options
+                )
+            except HTTPException as e:
+                return {"filename": name, "error": e.detail, "status_code": e.status_code, "headers": e.headers}
+            except Exception as e:
+                return {"filename": name, "error": str(e)}
+            del content
+            # stores are serialized per root, cleaning of the other files carries on meanwhile
+            stats = await asyncio.to_thread(_store_cleaned, path)
+            return {"filename": name, "summary": report, "partitions": stats}
+        finally:
+            _discard(path)
+            slots.release()
+
+    members = _batch_members(uploaded_files)
+    tasks = []
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                member = await asyncio.to_thread(next, members, None)
+            except (tarfile.TarError, zipfile.BadZipFile) as e:
+                slots.release()
+                raise HTTPException(status_code=400, detail=f"Unreadable archive: {e}")
+            if member is None:
+                slots.release()
+                break
+            tasks.append(asyncio.create_task(clean_one(*member)))
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    partitions: Dict[str, PartitionStats] = {}
+    for r in results:
+        # a partition touched by several files is reported once, as it was after the last write
+        partitions.update((st.name, st) for st in r.pop("partitions", []))
+    refused = [r.pop("headers") for r in results if r.get("status_code") == 503]
+    if results and len(refused) == len(results):
+        raise HTTPException(status_code=503, detail="Executor saturated", headers=refused[0])
+    for r in results:
+        r.pop("headers", None)
+    await asyncio.to_thread(sync_partitions, db, partitions.values())
+    summary = combine_reports(r["summary"] for r in results if "summary" in r)
+    return JSONResponse({
+        "summary": asdict(summary),
+        "files": [
+            {"filename": r["filename"], "summary": asdict(r["summary"])} if "summary" in r else r for r in results
+        ],
+        "partitions": [
+            {"name": st.name, "size_bytes": st.size_bytes, "record_count": st.record_count}
+            for st in sorted(partitions.values(), key=lambda st: st.name)
+        ],
+    })
 
 
 @app.post("/process/clean/parquet")
@@ -48,22 +373,53 @@ async def clean_and_export_parquet(
     pair_separator: Optional[str] = Form('/'),
     fill_method: str = Form('ffill'),
     ticker_map_json: Optional[str] = Form(None),
+    stream: Optional[bool] = Form(None),
+    compression: ParquetCodec = Form('snappy'),
+    row_group_size: int = Form(ParquetWriteOptions.row_group_size, gt=0),
+    use_dictionary: bool = Form(True),
 ):
-    raw_content = await uploaded_file.read()
-    df = read_any(raw_content, uploaded_file.filename)
     ticker_map = json.loads(ticker_map_json) if ticker_map_json else None
+    write_options = ParquetWriteOptions(compression, row_group_size, use_dictionary)
+    if result_cache is not None:
+        path, _ = await _cached_clean(uploaded_file, stream, ticker_map, pair_separator, resample_interval, fill_method)
+        return _parquet_response(_iter_cached_parquet(path, write_options), uploaded_file.filename)
 
-    cleaned_df, _ = clean_crypto_df(
-        df,
-        symbol_map=ticker_map,
-        base_quote_sep=pair_separator or None,
-        resample_to=resample_interval,
-        freq_fill=fill_method,
-    )
-
-    parquet_bytes = to_parquet_bytes(cleaned_df)
-
-    return JSONResponse({"size_bytes": len(parquet_bytes)})
+    # the cleaned file is written to disk by the job and sent from there in chunks, so it is never held in memory
+    fd, path = tempfile.mkstemp(suffix=".parquet", dir=processing_settings.CLEAN_STREAM_SPOOL_DIR)
+    os.close(fd)
+    # a job that times out keeps running and would write the file after it was removed here
+    on_abandon = functools.partial(_discard, path)
+    try:
+        if _should_stream(uploaded_file, stream):
+            await _offload(
+                executor.run_local,
+                _stream_to_file,
+                uploaded_file,
+                path,
+                write_options,
+                ticker_map,
+                pair_separator,
+                resample_interval,
+                fill_method,
+                on_abandon=on_abandon,
+            )
+        else:
+            raw_content = await uploaded_file.read()
+            await _offload(
+                executor.run,
+                clean_bytes_to_file,
+                raw_content,
+                uploaded_file.filename,
+                path,
+                write_options,
+                on_abandon=on_abandon,
+                **_clean_options(ticker_map, pair_separator, resample_interval, fill_method),
+            )
+            del raw_content
+    except BaseException:
+        _discard(path)
+        raise
+    return _parquet_response(_iter_file(open(path, "rb"), delete=True), uploaded_file.filename)
 
 
 class TickerMappingBody(BaseModel):
@@ -72,7 +428,7 @@ class TickerMappingBody(BaseModel):
 
 @app.post("/symbols/normalize")
 async def normalize_ticker_symbols(file: UploadFile = File(...), body: TickerMappingBody = None):
-    from utils.file_utils import standardize_columns, normalize_tickers
+    from utils.data import standardize_columns, normalize_tickers
 
     raw_content = await file.read()
     df = read_any(raw_content, file.filename)
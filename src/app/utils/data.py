@@ -1,14 +1,25 @@
 from __future__ import annotations
-from dataclasses import dataclass
+import csv
+import os
+import re
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from io import BytesIO
-from typing import Dict, Iterable, List, Literal, Optional, Tuple
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Tuple, Union
 
 
 import pandas as pd
 import numpy as np
 
+from .symbols import SymbolTable, symbol_table
+
 TimeCol = Literal["timestamp", "time", "date", "datetime"]
 PriceCols = List[str]
+SymbolMap = Union[Dict[str, str], SymbolTable, None]
 
 
 @dataclass
@@ -20,133 +31,726 @@ class CleanReport:
     cols_after: List[str]
     inferred_ts_unit: Optional[str]
     warnings: List[str]
+    stages: List["StageStats"] = field(default_factory=list)
+
+_COLUMN_ALIASES = {
+    "ts": "timestamp",
+    "open_time": "timestamp",
+    "close_time": "timestamp_close",
+    "symbol": "ticker",
+    "pair": "ticker",
+    "price": "close",
+}
+
+_NUMERIC_HINTS = ("open","high","low","close","price","volume","quote_volume","base_volume","wap")
+_TIME_COLUMNS = ("timestamp","time","date","datetime")
+
+Format = Literal["csv", "json", "jsonl", "parquet"]
+_PARQUET_MAGIC = b"PAR1"
+_SNIFF_BYTES = 64 * 1024
+
+
+def _standard_name(col: str) -> str:
+    name = col.strip().lower().replace(" ", "_")
+    return _COLUMN_ALIASES.get(name, name)
+
 
-def read_any(file_bytes: bytes, filename: str) -> pd.DataFrame:
-    name = filename.lower()
+def _is_numeric_hint(std_name: str) -> bool:
+    return not std_name.startswith("timestamp") and any(h in std_name for h in _NUMERIC_HINTS)
+
+
+def sniff_format(head: bytes) -> Format:
+    """Guess the format from the first bytes of a file rather than from its name."""
+    if head[:4] == _PARQUET_MAGIC:
+        return "parquet"
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if text[:1] == b"[":
+        return "json"
+    if text[:1] == b"{":
+        # one complete object per line is JSON lines; a pretty-printed document is not
+        first_line = text.split(b"\n", 1)[0].rstrip()
+        return "jsonl" if first_line.endswith(b"}") else "json"
+    return "csv"
+
+
+def _csv_header(head: bytes) -> List[str]:
+    line = head.split(b"\n", 1)[0].decode("utf-8-sig", errors="replace").rstrip("\r")
+    return next(csv.reader([line]), [])
+
+
+def pipeline_columns(names: Iterable[str]) -> Optional[List[str]]:
+    """
+    The raw column names `clean_crypto_df` actually uses: time, ticker and numeric columns.
+    Returns None when there is no recognisable time column, since `coerce_datetime` then has
+    to look at every column.
+    """
+    names = list(names)
+    std = {n: _standard_name(n) for n in names}
+    if not any(s in _TIME_COLUMNS for s in std.values()):
+        return None
+    keep = [n for n in names if std[n] in _TIME_COLUMNS or std[n] == "ticker" or _is_numeric_hint(std[n])]
+    return keep or None
+
+
+def _read_arrow(bio: BytesIO, head: bytes, fmt: Format, project: bool) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        names = pq.ParquetFile(bio).schema_arrow.names
+        bio.seek(0)
+        table = pq.read_table(bio, columns=pipeline_columns(names) if project else None, use_threads=True)
+
+    elif fmt == "jsonl":
+        table = pa_json.read_json(bio, read_options=pa_json.ReadOptions(use_threads=True))
+        keep = pipeline_columns(table.column_names) if project else None
+        if keep:
+            table = table.select(keep)
+
+    else:
+        names = _csv_header(head)
+        keep = pipeline_columns(names) if project else None
+        hinted = {n: pa.float64() for n in (keep or names) if _is_numeric_hint(_standard_name(n))}
+        read_options = pa_csv.ReadOptions(use_threads=True)
+        try:
+            table = pa_csv.read_csv(
+                bio,
+                read_options=read_options,
+                convert_options=pa_csv.ConvertOptions(column_types=hinted, include_columns=keep),
+            )
+        except pa.ArrowInvalid:
+            # a hinted column holds text; let coerce_numeric deal with it instead
+            bio.seek(0)
+            table = pa_csv.read_csv(
+                bio, read_options=read_options, convert_options=pa_csv.ConvertOptions(include_columns=keep)
+            )
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_any(file_bytes: bytes, filename: str, project: bool = False) -> pd.DataFrame:
+    """
+    Parse an upload into a frame. The format is sniffed from the content; `filename` is kept for
+    callers but no longer decides anything. With `project`, only `pipeline_columns` are read.
+    """
+    head = file_bytes[:_SNIFF_BYTES]
+    fmt = sniff_format(head)
     bio = BytesIO(file_bytes)
 
-    if name.endswith(".csv") or name.endswith(".txt"):
-        return pd.read_csv(bio)
-    
-    if name.endswith(".json"):
-        return pd.read_json(bio, lines=True)
-    
-    if name.endswith(".parquet"):
+    if fmt != "json":
+        try:
+            return _read_arrow(bio, head, fmt, project)
+        except ImportError:
+            bio.seek(0)
+
+    if fmt == "parquet":
         return pd.read_parquet(bio)
-    try:
-        bio.seek(0)
-        return pd.read_csv(bio)
-    except Exception:
-        bio.seek(0)
-        return pd.read_json(bio)
+    if fmt in ("json", "jsonl"):
+        df = pd.read_json(bio, lines=(fmt == "jsonl"))
+        keep = pipeline_columns(df.columns) if project else None
+        return df[keep] if keep else df
+
+    keep = pipeline_columns(_csv_header(head)) if project else None
+    return pd.read_csv(bio, usecols=keep)
+
+
+def iter_any(
+    fileobj: BinaryIO, filename: str, chunk_rows: int = 500_000, project: bool = False
+) -> Iterator[pd.DataFrame]:
+    """Like `read_any`, but yields frames of at most `chunk_rows` rows instead of one big frame."""
+    head = fileobj.read(_SNIFF_BYTES)
+    fileobj.seek(0)
+    fmt = sniff_format(head)
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(fileobj)
+        keep = pipeline_columns(pf.schema_arrow.names) if project else None
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=keep):
+            yield batch.to_pandas()
+        return
+
+    if fmt == "jsonl":
+        for chunk in pd.read_json(fileobj, lines=True, chunksize=chunk_rows):
+            keep = pipeline_columns(chunk.columns) if project else None
+            yield chunk[keep] if keep else chunk
+        return
+
+    if fmt == "json":
+        # a JSON document cannot be split, so this one is read in one go
+        yield pd.read_json(fileobj)
+        return
+
+    keep = pipeline_columns(_csv_header(head)) if project else None
+    yield from pd.read_csv(fileobj, chunksize=chunk_rows, usecols=keep)
+
+
+_ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+def is_archive(filename: str) -> bool:
+    return (filename or "").lower().endswith(_ARCHIVE_SUFFIXES)
+
+
+def iter_archive(fileobj: BinaryIO, filename: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    (name, bytes) of every regular file in a zip or tar archive, one member in memory at a
+    time. Directories, hidden files and macOS resource forks are skipped.
+    """
+    def wanted(name: str) -> bool:
+        base = os.path.basename(name)
+        return bool(base) and not base.startswith((".", "._")) and "__MACOSX/" not in name
+
+    if filename.lower().endswith(".zip"):
+        import zipfile
+
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and wanted(info.filename):
+                    yield info.filename, zf.read(info)
+        return
+
+    import tarfile
+
+    with tarfile.open(fileobj=fileobj, mode="r:*") as tf:
+        for member in tf:
+            if member.isfile() and wanted(member.name):
+                yield member.name, tf.extractfile(member).read()
+
+
+# Each stage has an in-place form used by CleaningPipeline, which owns its frame, and a public
+# form that copies first so callers holding the frame are not affected.
+
+def _standardize_columns(df: pd.DataFrame) -> None:
+    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    df.rename(columns={k: v for k, v in _COLUMN_ALIASES.items() if k in df.columns}, inplace=True)
 
 
 def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
-    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
-    # common aliases
-    alias = {
-    "ts": "timestamp",
-    "open_time": "timestamp",
-    "close_time": "timestamp_close",
-    "symbol": "ticker",
-    "pair": "ticker",
-    "price": "close",
-    }
-    df.rename(columns={k: v for k, v in alias.items() if k in df.columns}, inplace=True)
+    _standardize_columns(df)
     return df
 
 
-    _TS_UNITS = {
+# ticks per second of each epoch unit
+_TS_UNITS = {
     "s": 1,
     "ms": 1_000,
     "us": 1_000_000,
     "ns": 1_000_000_000,
-    }
+}
+# epoch seconds a real market timestamp falls in: 1990-01-01 to 2100-01-01
+_EPOCH_RANGE_S = (631_152_000, 4_102_444_800)
+_TS_SAMPLE_ROWS = 1_000
+# share of sampled values that must parse for a column to be taken as the time column
+_TS_MIN_PARSED = 0.9
+# month-first before day-first, as pandas reads dates where both orders are valid
+_TS_FORMATS = (
+    "ISO8601",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y/%m/%d %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%d/%m/%Y %H:%M",
+    "%d.%m.%Y %H:%M:%S",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+)
+# formats whose shape is shared with the other day/month order; which one a column uses depends
+# on its values, not its shape, so these are resolved from each column's own sample
+_DAY_MONTH_FORMATS = frozenset(f for f in _TS_FORMATS if "%d/%m" in f or "%m/%d" in f)
+_DIGITS = re.compile(r"\d")
+# resolved format per string shape (digits masked), e.g. "dddd-dd-ddTdd:dd:ddZ" -> "ISO8601", least recently used first
+_FORMAT_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_FORMAT_CACHE_SIZE = 256
 
 
-def coerce_datetime(df: pd.DataFrame, time_col_candidates: Iterable[str] = ("timestamp","time","date","datetime")) -> Tuple[pd.DataFrame, Optional[str]]:
-    df = df.copy()
+def _sample(col: pd.Series, n: int = _TS_SAMPLE_ROWS) -> pd.Series:
+    """Up to `n` non-null values spread evenly over the column, so sorted or clustered data is still represented."""
+    values = col.dropna()
+    if len(values) <= n:
+        return values
+    return values.iloc[np.linspace(0, len(values) - 1, n).astype(np.intp)]
+
+
+def _infer_ts_unit(col: pd.Series) -> Optional[str]:
+    """Epoch unit that puts the median of a sample of `col` inside `_EPOCH_RANGE_S`, or None if no unit does."""
+    sample = pd.to_numeric(_sample(col), errors="coerce").dropna()
+    if sample.empty:
+        return None
+    median = float(np.median(np.abs(sample.to_numpy(dtype=np.float64))))
+    lo, hi = _EPOCH_RANGE_S
+    for unit, per_second in _TS_UNITS.items():
+        if lo <= median / per_second <= hi:
+            return unit
+    return None
+
+
+def _parsed_share(sample: pd.Series, fmt: str) -> float:
+    try:
+        parsed = pd.to_datetime(sample, format=fmt, errors="coerce", utc=True)
+    except (ValueError, TypeError):
+        return 0.0
+    return float(parsed.notna().mean())
+
+
+def _infer_ts_format(col: pd.Series) -> Optional[str]:
+    """
+    Explicit format that parses a sample of a string column. Formats are cached by the shape of
+    the first sampled value, so the same layout is only searched for once per process. Day/month
+    formats are never cached: a sample both orders parse is read month-first, whatever earlier
+    columns of the same shape turned out to be.
+    """
+    sample = _sample(col).astype(str)
+    if sample.empty:
+        return None
+    shape = _DIGITS.sub("d", sample.iloc[0])
+    fmt = _FORMAT_CACHE.get(shape)
+    if fmt is not None and _parsed_share(sample, fmt) >= _TS_MIN_PARSED:
+        _FORMAT_CACHE.move_to_end(shape)
+        return fmt
+    fmt = next((f for f in _TS_FORMATS if _parsed_share(sample, f) >= _TS_MIN_PARSED), None)
+    if fmt is not None and fmt not in _DAY_MONTH_FORMATS:
+        _FORMAT_CACHE[shape] = fmt
+        _FORMAT_CACHE.move_to_end(shape)
+        if len(_FORMAT_CACHE) > _FORMAT_CACHE_SIZE:
+            _FORMAT_CACHE.popitem(last=False)
+    return fmt
+
+
+def _resolve_ts(col: pd.Series) -> Tuple[Optional[str], Optional[str]]:
+    """
+    How to parse `col` as timestamps, decided from a sample: `(kind, unit_or_format)` where kind
+    is "datetime" (already parsed), "epoch" with a unit, "string" with a format, or None.
+    """
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return "datetime", np.datetime_data(col.dtype.base)[0]
+    if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+        unit = _infer_ts_unit(col)
+        return ("epoch", unit) if unit else (None, None)
+    if pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col):
+        sample = _sample(col).astype(str)
+        if sample.str.fullmatch(r"\d+(\.\d+)?").all():
+            # epochs stored as text
+            unit = _infer_ts_unit(sample)
+            return ("epoch", unit) if unit else (None, None)
+        fmt = _infer_ts_format(col)
+        return ("string", fmt) if fmt else (None, None)
+    return None, None
+
+
+def _parse_ts(col: pd.Series, kind: Optional[str], how: Optional[str]) -> pd.Series:
+    """Parse the whole column once, as resolved by `_resolve_ts`; unparseable values become NaT."""
+    if kind == "datetime":
+        return col.dt.tz_localize("UTC") if col.dt.tz is None else col.dt.tz_convert("UTC")
+    if kind == "epoch":
+        return pd.to_datetime(pd.to_numeric(col, errors="coerce"), unit=how, utc=True)
+    if kind == "string":
+        return pd.to_datetime(col, format=how, utc=True, errors="coerce")
+    return pd.to_datetime(col, utc=True, errors="coerce")
+
+
+def _coerce_datetime(df: pd.DataFrame, time_col_candidates: Iterable[str] = _TIME_COLUMNS) -> Optional[str]:
+    """
+    Add a UTC `timestamp` column and sort by it. Returns the epoch unit of a numeric time
+    column, the unit of an already parsed one, "iso" for strings with a recognised format, or
+    None when no way to parse it was found and pandas' own inference was used as a fallback.
+
+    The unit or format is resolved from a bounded sample of rows and the full column is then
+    parsed exactly once. Without a known time column, each column is only tested on its
+    sample; columns named like prices or volumes are skipped, as their magnitudes can pass
+    for epochs.
+    """
     time_col = next((c for c in time_col_candidates if c in df.columns), None)
-    inferred = None
     if time_col is None:
-    # try to parse any column that looks datetime
         for c in df.columns:
-            try:
-                parsed = pd.to_datetime(df[c], errors="raise", utc=True)
-                df.insert(0, "timestamp", parsed)
-                inferred = "iso"
-                break
-            except Exception:
+            if _is_numeric_hint(c):
                 continue
+            kind, how = _resolve_ts(df[c])
+            if kind is not None:
+                time_col = c
+                break
+        if time_col is None:
+            return None
+        df.insert(0, "timestamp", _parse_ts(df[time_col], kind, how))
     else:
-        col = df[time_col]
-        if pd.api.types.is_numeric_dtype(col):
-            unit = _infer_ts_unit(col)
-            inferred = unit
+        kind, how = _resolve_ts(df[time_col])
+        df["timestamp"] = _parse_ts(df[time_col], kind, how)
 
-            if unit:
-                df["timestamp"] = pd.to_datetime(col, unit=unit, utc=True)
-            else:
-                df["timestamp"] = pd.to_datetime(col, utc=True, errors="coerce")
-        else:
-                df["timestamp"] = pd.to_datetime(col, utc=True, errors="coerce")
-        if time_col != "timestamp":
-                    pass
-        if "timestamp" in df.columns:
-                df = df.sort_values("timestamp").reset_index(drop=True)
-                return df, inferred
+    df.sort_values("timestamp", kind="mergesort", inplace=True, ignore_index=True)
+    return "iso" if kind == "string" else how
+
+
+def coerce_datetime(df: pd.DataFrame, time_col_candidates: Iterable[str] = _TIME_COLUMNS) -> Tuple[pd.DataFrame, Optional[str]]:
+    df = df.copy()
+    inferred = _coerce_datetime(df, time_col_candidates)
+    return df, inferred
+
+
+def _coerce_numeric(df: pd.DataFrame) -> None:
+    for c in df.columns:
+        if _is_numeric_hint(c):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
 
-_NUMERIC_HINTS = ("open","high","low","close","price","volume","quote_volume","base_volume","wap")
 
 def coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
-        for c in df.columns:
-             if any(h in c for h in _NUMERIC_HINTS):
-                df[c] = pd.to_numeric(df[c], errors="coerce")
-                return df
-             
-def normalize_tickers(df: pd.DataFrame, mapping: Optional[Dict[str,str]] = None, base_quote_sep: Optional[str] = None) -> pd.DataFrame:
     df = df.copy()
-    if "ticker" in df.columns:
-        df["ticker"] = df["ticker"].astype(str).str.strip().str.upper()
-    if base_quote_sep and base_quote_sep in df["ticker"].iloc[0]:
-     df["ticker"] = df["ticker"].str.replace(base_quote_sep, "", regex=False)
-    if mapping:
-        df["ticker"] = df["ticker"].map(lambda x: mapping.get(x, x))
+    _coerce_numeric(df)
     return df
 
-# this function for drop dupes
-def drop_dupes(df: pd.DataFrame, keys: Optional[List[str]] = None) -> Tuple[pd.DataFrame, int]:
+
+def _normalize_tickers(df: pd.DataFrame, mapping: SymbolMap = None, base_quote_sep: Optional[str] = None) -> None:
+    """
+    Normalize the ticker column through its categories: each distinct symbol is normalized
+    once by the `SymbolTable` (a plain mapping is compiled into one) and the rows only get new
+    category codes. The column is left categorical.
+    """
+    if "ticker" not in df.columns:
+        return
+    col = df["ticker"]
+    cat = col.array if isinstance(col.dtype, pd.CategoricalDtype) else pd.Categorical(col)
+    labels = symbol_table(mapping).normalize(cat.categories, base_quote_sep)
+    # different spellings may normalize to the same symbol, so the new categories are factorized again
+    codes, uniques = pd.factorize(labels)
+    # NaN rows keep code -1; an all-NaN column has no categories to look codes up in
+    present = cat.codes >= 0
+    new_codes = np.full(len(cat.codes), -1, dtype=np.intp)
+    new_codes[present] = codes[cat.codes[present]]
+    df["ticker"] = pd.Categorical.from_codes(new_codes, categories=pd.Index(uniques, dtype=object))
+
+
+def normalize_tickers(df: pd.DataFrame, mapping: SymbolMap = None, base_quote_sep: Optional[str] = None) -> pd.DataFrame:
     df = df.copy()
-    keys = keys or [c for c in ("timestamp","ticker") if c in df.columns] or df.columns.tolist()
-    before = len(df)
-    df = df.drop_duplicates(subset=keys)
-    return df, before - len(df)
+    _normalize_tickers(df, mapping, base_quote_sep)
+    return df
+
+
+DedupPolicy = Literal["first", "last", "max_volume"]
+
+
+def _dedup_keys(df: pd.DataFrame, keys: Optional[List[str]] = None) -> List[str]:
+    return keys or [c for c in ("timestamp","ticker") if c in df.columns] or df.columns.tolist()
+
+
+def row_hashes(df: pd.DataFrame, keys: List[str]) -> np.ndarray:
+    """
+    One 64-bit hash per row over the `keys` columns. Rows with equal keys hash equally, also
+    across frames; distinct keys collide with probability about n²/2⁶⁵ for n rows, which is
+    accepted in exchange for never materializing the key tuples.
+    """
+    return pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+
+
+def _dedup_volume(df: pd.DataFrame) -> Optional[np.ndarray]:
+    if "volume" not in df.columns:
+        return None
+    vol = df["volume"].to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isnan(vol), -np.inf, vol)
+
+
+def _keep_mask(hashes: np.ndarray, keep: DedupPolicy = "first", volume: Optional[np.ndarray] = None) -> np.ndarray:
+    """Which rows survive deduplication of `hashes` under `keep`; max_volume keeps the first of tied rows."""
+    if keep == "max_volume" and volume is not None:
+        pos = np.arange(len(hashes))
+        order = np.lexsort((pos, -volume, hashes))
+        # the first row of each run of equal hashes in that order has the highest volume
+        leaders = np.ones(len(order), dtype=bool)
+        leaders[1:] = hashes[order[1:]] != hashes[order[:-1]]
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[order[leaders]] = True
+        return mask
+    if keep not in ("first", "last", "max_volume"):
+        raise ValueError(f"Unknown dedup policy: {keep!r}")
+    # without a volume column max_volume has nothing to compare and keeps the first row
+    return ~pd.Series(hashes).duplicated(keep="last" if keep == "last" else "first").to_numpy()
+
+
+def _dedup_mask(df: pd.DataFrame, keys: Optional[List[str]] = None, keep: DedupPolicy = "first") -> np.ndarray:
+    """
+    Rows to keep when dropping rows with duplicate keys: `keys`, else timestamp and ticker,
+    else all columns. Works on one hash per row instead of the key columns themselves.
+    """
+    hashes = row_hashes(df, _dedup_keys(df, keys))
+    return _keep_mask(hashes, keep, _dedup_volume(df))
+
+
+# this function for drop dupes
+def drop_dupes(
+    df: pd.DataFrame, keys: Optional[List[str]] = None, keep: DedupPolicy = "first"
+) -> Tuple[pd.DataFrame, int]:
+    mask = _dedup_mask(df, keys, keep)
+    return df[mask], int(len(mask) - mask.sum())
+
+
+_OHLC_AGG = {"open": "first", "high": "max", "low": "min", "close": "last"}
+
+
+def _ohlcv_agg(cols: Iterable[str]) -> Dict[str, str]:
+    return {c: _OHLC_AGG.get(c, "sum" if "volume" in c else "last") for c in cols}
+
+
+def _resolve_origin(ts: pd.Series, origin: Union[str, pd.Timestamp]) -> pd.Timestamp:
+    if isinstance(origin, pd.Timestamp):
+        return origin
+    if origin == "epoch":
+        return pd.Timestamp(0, tz=ts.dt.tz)
+    if origin == "start":
+        return ts.min()
+    return ts.min().floor("D")
+
+
+def _resample_fixed(
+    df: pd.DataFrame, step: pd.Timedelta, origin: pd.Timestamp, by: Optional[str], agg: Dict[str, str]
+) -> pd.DataFrame:
+    """Fixed-width bins: one hash groupby over (group, bin number), then every group's gaps are filled in by a vectorized reindex."""
+    bin_no = ((df["timestamp"] - origin) // step).to_numpy(dtype=np.int64)
+    keys = df[by].to_numpy() if by else np.zeros(len(df), dtype=np.int8)
+    g = df[list(agg)].groupby([keys, bin_no], sort=True).agg(agg)
+
+    # full grid: each group runs from its first to its last bin
+    key_codes, key_labels = pd.factorize(g.index.get_level_values(0), sort=False)
+    bins = g.index.get_level_values(1).to_numpy()
+    starts = np.flatnonzero(np.r_[True, key_codes[1:] != key_codes[:-1]])
+    ends = np.r_[starts[1:], len(bins)] - 1
+    counts = bins[ends] - bins[starts] + 1
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    grid_bins = np.repeat(bins[starts], counts) + offsets
+    grid_keys = np.repeat(np.asarray(key_labels), counts)
+    g = g.reindex(pd.MultiIndex.from_arrays([grid_keys, grid_bins]))
+
+    # empty bins sum to zero, as in DataFrame.resample
+    sum_cols = [c for c, how in agg.items() if how == "sum"]
+    g[sum_cols] = g[sum_cols].fillna(0)
+
+    out = g.reset_index(drop=True)
+    out.insert(0, "timestamp", origin + pd.to_timedelta(grid_bins * step.value, unit="ns"))
+    if by:
+        out.insert(1, by, grid_keys)
+    return out
 
 
-def fill_missing_ohlcv(df: pd.DataFrame, freq: str = "1min", method: Literal["ffill","bfill","none"] = "ffill") -> pd.DataFrame:
+def _resample_calendar(df: pd.DataFrame, freq: str, by: Optional[str], agg: Dict[str, str]) -> pd.DataFrame:
+    """Calendar frequencies (weeks, months) have no fixed width and are anchored to the calendar, so these go through groupby().resample."""
+    indexed = df.set_index("timestamp")
+    source = indexed.groupby(by, sort=True) if by else indexed
+    # one resample per column: a dict passed to a grouped resampler's agg() is applied to every column
+    out = pd.concat({c: source[c].resample(freq).agg(f) for c, f in agg.items()}, axis=1)
+    out = out.reset_index()
+    return out[["timestamp", *([by] if by else []), *agg]]
+
+
+def _fill_gaps(out: pd.DataFrame, method: Literal["ffill","bfill","none"], by: Optional[str]) -> None:
+    if method == "none":
+        return
+    value_cols = [c for c in out.columns if c not in ("timestamp", by)]
+    grouped = out.groupby(by, sort=False)[value_cols] if by else out[value_cols]
+    out[value_cols] = grouped.ffill() if method == "ffill" else grouped.bfill()
+
+
+def fill_missing_ohlcv(
+    df: pd.DataFrame,
+    freq: str = "1min",
+    method: Literal["ffill","bfill","none"] = "ffill",
+    origin: Union[str, pd.Timestamp] = "start_day",
+    by: Optional[str] = "ticker",
+) -> pd.DataFrame:
+    """
+    Resample to `freq` bars per `by` group, all groups in one pass: open is the first value,
+    high the max, low the min, close the last, volume columns are summed and anything else keeps
+    its last value. Each group's missing bars between its first and last bar are filled with
+    `method`, never from a neighbouring group. The result is ordered by timestamp, then group.
+    Rows without a group label are dropped.
+    """
     if "timestamp" not in df.columns:
         return df
-    df = df.set_index("timestamp").sort_index()
-    agg = {c: ("sum" if "volume" in c else "last") for c in df.columns}
-    out = df.resample(freq).agg(agg)
-    if method != "none":
-        out = out.fillna(method=method)
-    out = out.reset_index()
-    return out
+    df = df[df["timestamp"].notna()]
+    by = by if by in df.columns else None
+    agg = _ohlcv_agg(c for c in df.columns if c not in ("timestamp", by))
+    if df.empty:
+        return df[["timestamp", *([by] if by else []), *agg]].reset_index(drop=True)
 
+    step = pd.tseries.frequencies.to_offset(freq)
+    if isinstance(step, pd.offsets.Tick):
+        out = _resample_fixed(df, pd.Timedelta(step), _resolve_origin(df["timestamp"], origin), by, agg)
+    else:
+        out = _resample_calendar(df, freq, by, agg)
 
-def detect_outliers_iqr(df: pd.DataFrame, cols: Iterable[str]) -> pd.DataFrame:
-    df = df.copy()
-    for c in cols:
-        if c not in df.columns:
-            continue
-    q1, q3 = df[c].quantile([0.25, 0.75])
+    _fill_gaps(out, method, by)
+    return out.sort_values(["timestamp", *([by] if by else [])], kind="mergesort", ignore_index=True)
+
+
+def append_resampled_parquet(
+    directory: str,
+    new_rows: pd.DataFrame,
+    freq: str = "1min",
+    method: Literal["ffill","none"] = "ffill",
+    by: Optional[str] = "ticker",
+) -> int:
+    """
+    Incrementally extend a resampled partition with newly arrived cleaned rows.
+
+    The partition is a directory of append-only `part-NNNNN.parquet` files holding closed bars
+    plus `_open.parquet` holding the latest, possibly still growing, bar of each group. Because
+    OHLCV aggregation is associative, the open bars are resampled together with the new rows
+    instead of re-reading any history: only the new bars are written and the open file is
+    replaced. Bins use the epoch as origin so that every batch lands on the same grid. Rows
+    older than their group's open bar belong to bars that are already written and are skipped.
+    Returns the number of closed bars appended.
+    """
+    os.makedirs(directory, exist_ok=True)
+    open_path = os.path.join(directory, "_open.parquet")
+    open_bars = pd.read_parquet(open_path) if os.path.exists(open_path) else None
+
+    by = by if by in new_rows.columns else None
+    if open_bars is not None and not open_bars.empty:
+        # parquet may round-trip the timestamp at a different resolution
+        open_bars["timestamp"] = open_bars["timestamp"].astype(new_rows["timestamp"].dtype)
+        if by:
+            floor = new_rows[by].map(open_bars.set_index(by)["timestamp"])
+            new_rows = new_rows[floor.isna() | (new_rows["timestamp"] >= floor)]
+        else:
+            new_rows = new_rows[new_rows["timestamp"] >= open_bars["timestamp"].iloc[0]]
+        new_rows = pd.concat([open_bars, new_rows], ignore_index=True)
+
+    bars = fill_missing_ohlcv(new_rows, freq, method=method, origin="epoch", by=by)
+    if bars.empty:
+        return 0
+
+    last = bars.groupby(by, sort=False).tail(1) if by else bars.tail(1)
+    closed = bars.drop(index=last.index)
+    if not closed.empty:
+        parts = sorted(f for f in os.listdir(directory) if f.startswith("part-"))
+        closed.to_parquet(os.path.join(directory, f"part-{len(parts):05d}.parquet"), index=False)
+
+    tmp_path = open_path + ".tmp"
+    last.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, open_path)
+    return len(closed)
+
+
+def read_resampled_parquet(directory: str) -> pd.DataFrame:
+    """All bars of a partition written by `append_resampled_parquet`, open bars included."""
+    files = sorted(f for f in os.listdir(directory) if f.startswith("part-"))
+    if os.path.exists(os.path.join(directory, "_open.parquet")):
+        files.append("_open.parquet")
+    frames = [pd.read_parquet(os.path.join(directory, f)) for f in files]
+    if not frames:
+        return pd.DataFrame()
+    sort_cols = [c for c in ("timestamp", "ticker") if c in frames[0].columns]
+    return pd.concat(frames, ignore_index=True).sort_values(sort_cols, kind="mergesort", ignore_index=True)
+
+
+def _group_keys(df: pd.DataFrame, by: Optional[str]) -> Union[pd.Series, np.ndarray]:
+    if by is None or by not in df.columns:
+        return np.zeros(len(df), dtype=np.int8)
+    return df[by]
+
+
+def iqr_fences(
+    df: pd.DataFrame, cols: List[str], by: Optional[str] = "ticker", k: float = 1.5
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Lower and upper IQR fences per group, from one groupby quantile pass over all `cols`.
+    Both frames have one row per group label and one column per entry of `cols`. Without a
+    `by` column there is a single group, labelled 0.
+    """
+    q = df[cols].groupby(_group_keys(df, by), sort=False).quantile([0.25, 0.75])
+    if q.empty:
+        # every group label is missing, so there are no groups to fence
+        empty = pd.DataFrame(columns=cols, dtype=np.float64)
+        return empty, empty
+    q1 = q.xs(0.25, level=-1)
+    q3 = q.xs(0.75, level=-1)
     iqr = q3 - q1
-    lo, hi = q1 - 1.5*iqr, q3 + 1.5*iqr
-    mask = (df[c] < lo) | (df[c] > hi)
-    df.loc[mask, c] = np.nan
+    return q1 - k*iqr, q3 + k*iqr
+
+
+def _row_fences(df: pd.DataFrame, by: Optional[str], lo: pd.DataFrame, hi: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Broadcast per-group fences to one row per row of `df`; rows of unknown groups get NaN and are never masked."""
+    if by is None or by not in df.columns:
+        pos = np.zeros(len(df), dtype=np.intp)
+    else:
+        pos = lo.index.get_indexer(df[by])
+    nan_row = np.full((1, lo.shape[1]), np.nan)
+    # position -1 picks the trailing NaN row
+    lo_tab = np.vstack([lo.to_numpy(dtype=np.float64), nan_row])
+    hi_tab = np.vstack([hi.to_numpy(dtype=np.float64), nan_row])
+    return lo_tab[pos], hi_tab[pos]
+
+
+def rolling_iqr_fences(
+    df: pd.DataFrame,
+    cols: List[str],
+    window: Union[int, str],
+    by: Optional[str] = "ticker",
+    k: float = 1.5,
+    min_periods: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Trailing-window IQR fences, one row per row of `df`, so that a long history is judged
+    against its own recent range. `window` is a row count or, on a frame sorted by
+    `timestamp`, an offset such as "30D". The groupby-rolling runs over every group in one pass.
+    """
+    time_window = isinstance(window, str)
+    frame = df[cols + ["timestamp"]] if time_window else df[cols]
+    if by is not None and by in df.columns:
+        rolling = frame.groupby(df[by], sort=False).rolling(window, min_periods=min_periods, on="timestamp" if time_window else None)
+    else:
+        rolling = frame.rolling(window, min_periods=min_periods, on="timestamp" if time_window else None)
+
+    def _aligned(q: float) -> np.ndarray:
+        out = rolling.quantile(q)[cols]
+        if out.index.nlevels > 1:
+            out = out.droplevel(0)
+        return out.reindex(df.index).to_numpy(dtype=np.float64)
+
+    q1, q3 = _aligned(0.25), _aligned(0.75)
+    iqr = q3 - q1
+    return q1 - k*iqr, q3 + k*iqr
+
+
+def _mask_outside(df: pd.DataFrame, cols: List[str], lo: np.ndarray, hi: np.ndarray) -> None:
+    values = df[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = (values < lo) | (values > hi)
+    # `values` may be a read-only view of the frame, so masked columns are built anew; only touched
+    # columns are replaced, which also upcasts integer columns instead of failing on NaN
+    for j in np.flatnonzero(mask.any(axis=0)):
+        df[cols[j]] = np.where(mask[:, j], np.nan, values[:, j])
+
+
+def _detect_outliers_iqr(
+    df: pd.DataFrame,
+    cols: Iterable[str],
+    by: Optional[str] = "ticker",
+    window: Union[int, str, None] = None,
+    k: float = 1.5,
+) -> None:
+    cols = [c for c in cols if c in df.columns]
+    if not cols or df.empty:
+        return
+    if window is None:
+        lo, hi = _row_fences(df, by, *iqr_fences(df, cols, by, k))
+    else:
+        lo, hi = rolling_iqr_fences(df, cols, window, by, k)
+    _mask_outside(df, cols, lo, hi)
+
+
+def detect_outliers_iqr(
+    df: pd.DataFrame,
+    cols: Iterable[str],
+    by: Optional[str] = "ticker",
+    window: Union[int, str, None] = None,
+    k: float = 1.5,
+) -> pd.DataFrame:
+    """Set values outside the IQR fences to NaN. Fences are computed per `by` group, over the
+    whole frame or over a trailing `window`; pass by=None for frame-wide fences."""
+    df = df.copy()
+    _detect_outliers_iqr(df, cols, by, window, k)
     return df
 
 def validate_schema(df: pd.DataFrame, required: Iterable[str]) -> List[str]:
@@ -154,48 +758,269 @@ def validate_schema(df: pd.DataFrame, required: Iterable[str]) -> List[str]:
     return miss
 
 
-def to_parquet_bytes(df: pd.DataFrame) -> bytes:
-    bio = BytesIO()
-    df.to_parquet(bio, index=False)
-    return bio.getvalue()
+ParquetCodec = Literal["snappy", "zstd", "lz4", "gzip", "brotli", "none"]
+
+
+@dataclass
+class ParquetWriteOptions:
+    compression: ParquetCodec = "snappy"
+    row_group_size: int = 128 * 1024
+    use_dictionary: bool = True
+
+
+class _ChunkSink:
+    """Write-only file object that hands over whatever the parquet writer has produced so far."""
+
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+
+def _row_groups(frames: Iterable, row_group_size: int):
+    import pyarrow as pa
+
+    schema = None
+    empty = None
+    for frame in frames:
+        if isinstance(frame, pa.RecordBatch):
+            table = pa.Table.from_batches([frame])
+        elif isinstance(frame, pa.Table):
+            table = frame
+        else:
+            table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+        schema = schema or table.schema
+        if table.num_rows == 0:
+            if empty is None:
+                empty = table
+            continue
+        for start in range(0, table.num_rows, row_group_size):
+            empty = False
+            yield table.slice(start, row_group_size)
+    # still write a valid file, with the schema when one is known
+    if empty is None:
+        yield pa.table({})
+    elif empty is not False:
+        yield empty
+
+
+def iter_parquet_bytes(frames: Iterable, options: Optional[ParquetWriteOptions] = None) -> Iterator[bytes]:
+    """
+    Encode a sequence of DataFrames or Arrow tables as one parquet file, yielding its bytes one
+    row group at a time, so the encoded file is never held in memory as a whole. Frames are cut
+    into row groups of `options.row_group_size` rows; all must share the first frame's schema.
+    """
+    import pyarrow.parquet as pq
+
+    options = options or ParquetWriteOptions()
+    sink = _ChunkSink()
+    writer = None
+    try:
+        for table in _row_groups(frames, options.row_group_size):
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    sink,
+                    table.schema,
+                    compression=options.compression,
+                    use_dictionary=options.use_dictionary,
+                )
+            writer.write_table(table, row_group_size=options.row_group_size)
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.take()
+
+
+def write_parquet(frames: Iterable, path, options: Optional[ParquetWriteOptions] = None) -> None:
+    """Write frames to a file path or binary file object row group by row group, see `iter_parquet_bytes`."""
+    f = open(path, "wb") if isinstance(path, (str, os.PathLike)) else path
+    try:
+        for chunk in iter_parquet_bytes(frames, options):
+            f.write(chunk)
+    finally:
+        if f is not path:
+            f.close()
+
+
+def to_parquet_bytes(df: pd.DataFrame, options: Optional[ParquetWriteOptions] = None) -> bytes:
+    return b"".join(iter_parquet_bytes([df], options))
+
+
+# pipelines profiling memory right now; tracemalloc runs while there is at least one
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+@contextmanager
+def _tracemalloc() -> Iterator[None]:
+    """Keep tracemalloc running for the duration, starting it if needed and stopping it after the last user."""
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_users = 1
+        elif _tracing_users:
+            _tracing_users += 1
+    try:
+        yield
+    finally:
+        with _tracing_lock:
+            if _tracing_users:
+                _tracing_users -= 1
+                if _tracing_users == 0:
+                    tracemalloc.stop()
+
+
+@dataclass
+class StageStats:
+    name: str
+    seconds: float
+    frame_bytes: int
+    peak_bytes: Optional[int] = None
+
+
+class CleaningPipeline:
+    """
+    Runs the cleaning stages over a single frame it owns, in place, instead of each stage
+    copying its input. The input is copied once unless `copy=False`, in which case the
+    caller hands the frame over and must not use it afterwards.
+
+    Every stage appends a `StageStats` with its wall time and the frame's deep memory usage
+    afterwards, and passes it to `on_stage` if given, e.g. to report progress. With
+    `profile_memory`, tracemalloc (started for the stage unless it is already running) also
+    records the peak bytes allocated during the stage; this slows the run down and is meant for
+    benchmarking, not production. Peaks of pipelines profiled concurrently overlap.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        *,
+        copy: bool = True,
+        profile_memory: bool = False,
+        on_stage: Optional[Callable[[StageStats], None]] = None,
+    ) -> None:
+        self.df = df.copy() if copy else df
+        self.profile_memory = profile_memory
+        self.on_stage = on_stage
+        self.stages: List[StageStats] = []
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[None]:
+        peak = None
+        if self.profile_memory:
+            with _tracemalloc():
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                started = time.perf_counter()
+                yield
+                seconds = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] - base
+        else:
+            started = time.perf_counter()
+            yield
+            seconds = time.perf_counter() - started
+        frame_bytes = int(self.df.memory_usage(index=True, deep=True).sum())
+        stats = StageStats(name, seconds, frame_bytes, peak)
+        self.stages.append(stats)
+        if self.on_stage is not None:
+            self.on_stage(stats)
+
+    def standardize_columns(self) -> None:
+        with self._stage("standardize_columns"):
+            _standardize_columns(self.df)
+
+    def coerce_datetime(self) -> Optional[str]:
+        with self._stage("coerce_datetime"):
+            return _coerce_datetime(self.df)
+
+    def coerce_numeric(self) -> None:
+        with self._stage("coerce_numeric"):
+            _coerce_numeric(self.df)
+
+    def normalize_tickers(self, mapping: SymbolMap, base_quote_sep: Optional[str]) -> None:
+        with self._stage("normalize_tickers"):
+            _normalize_tickers(self.df, mapping, base_quote_sep)
+
+    def drop_dupes(self, keys: Optional[List[str]] = None, keep: DedupPolicy = "first") -> int:
+        with self._stage("drop_dupes"):
+            mask = _dedup_mask(self.df, keys, keep)
+            dropped = int(len(mask) - mask.sum())
+            if dropped:
+                self.df = self.df[mask]
+            return dropped
+
+    def detect_outliers_iqr(
+        self, cols: Iterable[str], by: Optional[str] = "ticker", window: Union[int, str, None] = None
+    ) -> None:
+        with self._stage("detect_outliers_iqr"):
+            _detect_outliers_iqr(self.df, cols, by, window)
+
+    def fill_missing_ohlcv(self, freq: str, method: Literal["ffill","bfill","none"]) -> None:
+        with self._stage("fill_missing_ohlcv"):
+            # resampling builds a new frame by nature; the old one is released right after
+            self.df = fill_missing_ohlcv(self.df, freq, method=method)
 
 
 def clean_crypto_df(
     df: pd.DataFrame,
     *,
-    symbol_map: Optional[Dict[str,str]] = None,
+    symbol_map: SymbolMap = None,
     base_quote_sep: Optional[str] = "/",
     resample_to: Optional[str] = None,
     outlier_cols: Optional[Iterable[str]] = ("open","high","low","close","volume"),
     freq_fill: Literal["ffill","bfill","none"] = "ffill",
+    outlier_by: Optional[str] = "ticker",
+    outlier_window: Union[int, str, None] = None,
+    dedup_keep: DedupPolicy = "first",
+    copy: bool = True,
+    profile_memory: bool = False,
+    on_stage: Optional[Callable[[StageStats], None]] = None,
     ) -> Tuple[pd.DataFrame, CleanReport]:
     warnings: List[str] = []
     rows_in = len(df)
     cols_before = df.columns.tolist()
-    df = standardize_columns(df)
+    pipe = CleaningPipeline(df, copy=copy, profile_memory=profile_memory, on_stage=on_stage)
+    pipe.standardize_columns()
 
-    df, inferred = coerce_datetime(df)
+    inferred = pipe.coerce_datetime()
     if inferred is None:
         warnings.append("زمان‌بندی پیدا نشد یا نامشخص بود؛ سعی شد تبدیل مستقیم انجام شود.")
-    df = coerce_numeric(df)
-    df = normalize_tickers(df, symbol_map, base_quote_sep)
-    df, dups = drop_dupes(df)
+    pipe.coerce_numeric()
+    pipe.normalize_tickers(symbol_map, base_quote_sep)
+    dups = pipe.drop_dupes(keep=dedup_keep)
 
-    required = [c for c in ("timestamp","open","high","low","close","volume") if c in df.columns or c != "timestamp"]
-    miss = validate_schema(df, required=["timestamp"])
+    miss = validate_schema(pipe.df, required=["timestamp"])
     if miss:
         warnings.append(f"ستون‌های ضروری یافت نشد: {miss}")
     if outlier_cols:
-        df = detect_outliers_iqr(df, [c for c in outlier_cols if c in df.columns])
-    
+        pipe.detect_outliers_iqr(outlier_cols, outlier_by, outlier_window)
+
     if resample_to:
         try:
-            df = fill_missing_ohlcv(df, resample_to, method=freq_fill)
+            pipe.fill_missing_ohlcv(resample_to, freq_fill)
         except Exception as e:
             warnings.append(f"خطای بازنمونه‌گیری: {e}")
 
-
-        report = CleanReport(
+    df = pipe.df
+    report = CleanReport(
         rows_in=rows_in,
         rows_out=len(df),
         duplicates_dropped=dups,
@@ -203,5 +1028,42 @@ def clean_crypto_df(
         cols_after=df.columns.tolist(),
         inferred_ts_unit=inferred,
         warnings=warnings,
-        )
-        return df, report
\ No newline at end of file
+        stages=pipe.stages,
+    )
+    return df, report
+
+
+def combine_reports(reports: Iterable[CleanReport]) -> CleanReport:
+    """
+    One report for several cleaning runs: counts and stage times are summed, columns and
+    warnings are merged in first-seen order, and the timestamp unit is kept only if all runs agree.
+    """
+    reports = list(reports)
+    cols_before: Dict[str, None] = {}
+    cols_after: Dict[str, None] = {}
+    warnings: Dict[str, None] = {}
+    stages: Dict[str, StageStats] = {}
+    for r in reports:
+        cols_before.update(dict.fromkeys(r.cols_before))
+        cols_after.update(dict.fromkeys(r.cols_after))
+        warnings.update(dict.fromkeys(r.warnings))
+        for st in r.stages:
+            total = stages.get(st.name)
+            if total is None:
+                stages[st.name] = StageStats(st.name, st.seconds, st.frame_bytes, st.peak_bytes)
+            else:
+                total.seconds += st.seconds
+                total.frame_bytes = max(total.frame_bytes, st.frame_bytes)
+                if st.peak_bytes is not None:
+                    total.peak_bytes = max(total.peak_bytes or 0, st.peak_bytes)
+    units = {r.inferred_ts_unit for r in reports}
+    return CleanReport(
+        rows_in=sum(r.rows_in for r in reports),
+        rows_out=sum(r.rows_out for r in reports),
+        duplicates_dropped=sum(r.duplicates_dropped for r in reports),
+        cols_before=list(cols_before),
+        cols_after=list(cols_after),
+        inferred_ts_unit=units.pop() if len(units) == 1 else None,
+        warnings=list(warnings),
+        stages=list(stages.values()),
+    )
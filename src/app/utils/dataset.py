@@ -0,0 +1,396 @@
+from __future__ import annotations
+import os
+import re
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from .data import ParquetWriteOptions, drop_dupes, write_parquet
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# one file per partition; rewritten whole when new rows land in it
+_PART_FILE = "part-0.parquet"
+# all partitions store timestamps at one resolution so the dataset has a single schema
+_TS_DTYPE = "datetime64[us, UTC]"
+# stores opened on the same root share one lock, so their read-modify-write merges do not interleave
+_ROOT_LOCKS: Dict[str, threading.Lock] = {}
+_ROOT_LOCKS_GUARD = threading.Lock()
+_NAME_RE = re.compile(r"^ticker=[^/]+/date=\d{4}-\d{2}-\d{2}$")
+
+
+@dataclass
+class PartitionStats:
+    name: str
+    ticker: str
+    date: str
+    path: str
+    size_bytes: int
+    record_count: int
+
+
+def dataset_dir(directory: Optional[str] = None) -> str:
+    """Root of the dataset store: `directory`, or a fixed place under the temp dir."""
+    return directory or os.path.join(tempfile.gettempdir(), "crypto-dataset")
+
+
+def partition_name(ticker: str, date: str) -> str:
+    """Hive path of a partition relative to the store root, e.g. `ticker=BTCUSDT/date=2024-01-01`."""
+    return f"ticker={quote(str(ticker), safe='')}/date={date}"
+
+
+def _parse_name(name: str) -> Tuple[str, str]:
+    ticker, date = (part.split("=", 1)[1] for part in name.split("/"))
+    return unquote(ticker), date
+
+
+def _day(ts: Optional[pd.Timestamp]) -> Optional[str]:
+    return None if ts is None else ts.strftime("%Y-%m-%d")
+
+
+def _utc(ts) -> Optional[pd.Timestamp]:
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _scan(dataset, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp], columns: Optional[Iterable[str]]):
+    """
+    `dataset` rows in [start, end) with timestamp, ticker and `columns` (all when None), filtered by
+    pyarrow. Requested columns the dataset lacks are left out, for the caller to fill when combining.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    ts_type = dataset.schema.field("timestamp").type
+    predicate = None
+    for op, bound in ((ds.field("timestamp").__ge__, start), (ds.field("timestamp").__lt__, end)):
+        if bound is not None:
+            term = op(pa.scalar(bound.to_pydatetime(), type=ts_type))
+            predicate = term if predicate is None else predicate & term
+
+    if columns is None:
+        cols = [c for c in dataset.schema.names if c != "date"]
+    else:
+        names = set(dataset.schema.names)
+        cols = ["timestamp", "ticker", *(c for c in columns if c not in ("timestamp", "ticker", "date") and c in names)]
+    return dataset.to_table(columns=cols, filter=predicate)
+
+
+class HotTier:
+    """
+    Uncompressed Arrow IPC (Feather v2) copies of frequently read partitions, opened with memory
+    mapping. Reading one costs no decompression and no copy: the table's buffers point into the
+    mapped file, and every worker process reading it shares the same page-cache pages.
+
+    A partition is promoted once it has been read `promote_after` times by this process, as long
+    as its copy fits in `max_bytes` after evicting copies read less often, least read first. Each copy records the mtime
+    of the parquet file it was made from and is ignored once that file has been replaced, so a
+    stale copy is never served, whichever process rewrote the partition. Removing a copy that
+    another process still has mapped is safe: the mapping outlives the directory entry.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, promote_after: int = 3) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.promote_after = promote_after
+        os.makedirs(directory, exist_ok=True)
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{quote(name, safe='')}.arrow")
+
+    def open(self, names: Iterable[str], source: Callable[[str], str]) -> Dict[str, "pa.Table"]:
+        """Memory-mapped tables of the `names` that have a current copy; `source` maps a name to its parquet path."""
+        import pyarrow as pa
+
+        tables = {}
+        for name in names:
+            path = self._path(name)
+            try:
+                table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+                mtime = os.stat(source(name)).st_mtime_ns
+            except (FileNotFoundError, pa.ArrowInvalid):
+                continue
+            if (table.schema.metadata or {}).get(b"source_mtime_ns") != str(mtime).encode():
+                self.discard(name)
+                continue
+            tables[name] = table.replace_schema_metadata(None)
+        return tables
+
+    def record(self, names: Iterable[str], source: Callable[[str], str]) -> None:
+        """Count a read of each of `names` and promote those that reached `promote_after` reads."""
+        with self._lock:
+            self._counts.update(names)
+            due = [n for n in set(names) if self._counts[n] >= self.promote_after and not os.path.exists(self._path(n))]
+        for name in sorted(due, key=self._counts.__getitem__, reverse=True):
+            if self._admit(name, source(name)):
+                self._promote(name, source(name))
+
+    def _entries(self) -> List[Tuple[int, float, str, int]]:
+        """(reads, mtime, file name, size) of every copy, least read and oldest first."""
+        entries = []
+        for fname in os.listdir(self.directory):
+            if fname.endswith(".arrow"):
+                try:
+                    st = os.stat(os.path.join(self.directory, fname))
+                except FileNotFoundError:
+                    continue
+                entries.append((self._counts[unquote(fname[: -len(".arrow")])], st.st_mtime, fname, st.st_size))
+        return sorted(entries)
+
+    def _admit(self, name: str, parquet_path: str) -> bool:
+        """
+        Make room for `name` by evicting copies read less often than it, or return False when
+        that is not enough. Copies read as often stay, so partitions with equal counts do not
+        keep replacing each other.
+        """
+        import pyarrow.parquet as pq
+
+        try:
+            meta = pq.ParquetFile(parquet_path).metadata
+        except FileNotFoundError:
+            return False
+        # the uncompressed size of the row groups approximates the size of the Arrow copy
+        need = sum(meta.row_group(i).total_byte_size for i in range(meta.num_row_groups))
+        count = self._counts[name]
+        entries = self._entries()
+        free = self.max_bytes - sum(e[3] for e in entries)
+        victims = []
+        for reads, _, fname, size in entries:
+            if free >= need or reads >= count:
+                break
+            victims.append(fname)
+            free += size
+        if free < need:
+            return False
+        for fname in victims:
+            try:
+                os.remove(os.path.join(self.directory, fname))
+            except FileNotFoundError:
+                pass
+        return True
+
+    def _promote(self, name: str, parquet_path: str) -> None:
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        try:
+            mtime = os.stat(parquet_path).st_mtime_ns
+            table = pq.read_table(parquet_path)
+        except FileNotFoundError:
+            return
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"source_mtime_ns": str(mtime).encode()})
+        path = self._path(name)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            feather.write_feather(table, tmp, compression="uncompressed")
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def discard(self, name: str) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+class DatasetStore:
+    """
+    Cleaned OHLCV rows on local disk as a Hive-partitioned parquet dataset, one directory per
+    ticker and UTC day: `<root>/ticker=<ticker>/date=<YYYY-MM-DD>/part-0.parquet`. The ticker is
+    URL-quoted in the path and, like the date, lives only in the path, not in the files.
+
+    Writing merges the new rows into the partitions they touch, keeping the last row per
+    timestamp, so re-ingesting an overlapping export does not duplicate bars. Each partition is
+    rewritten to a temporary file and renamed into place, so readers never see a partial file.
+
+    Reads prune partitions from the path alone: with tickers and a bounded range only the
+    matching directories are opened, without listing the store. The remaining time bounds and
+    the column selection are pushed down to pyarrow, which skips row groups by their timestamp
+    statistics and reads only the requested columns. With a `hot` tier, partitions read often
+    are served from memory-mapped Arrow copies instead of parquet.
+    """
+
+    def __init__(
+        self, root: str, write_options: Optional[ParquetWriteOptions] = None, hot: Optional[HotTier] = None
+    ) -> None:
+        self.root = root
+        self.write_options = write_options or ParquetWriteOptions()
+        self.hot = hot
+        os.makedirs(root, exist_ok=True)
+        with _ROOT_LOCKS_GUARD:
+            self._lock = _ROOT_LOCKS.setdefault(os.path.realpath(root), threading.Lock())
+
+    def _path(self, name: str) -> str:
+        if not self.is_partition(name):
+            raise ValueError(f"Not a dataset partition: {name!r}")
+        return os.path.join(self.root, *name.split("/"), _PART_FILE)
+
+    @staticmethod
+    def is_partition(name: str) -> bool:
+        return bool(_NAME_RE.match(name)) and ".." not in name
+
+    def stats(self, name: str) -> Optional[PartitionStats]:
+        import pyarrow.parquet as pq
+
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        ticker, date = _parse_name(name)
+        count = pq.ParquetFile(path).metadata.num_rows
+        return PartitionStats(name, ticker, date, path, os.path.getsize(path), count)
+
+    def write(self, df: pd.DataFrame) -> List[PartitionStats]:
+        """Merge cleaned rows into their partitions and return the stats of every partition written."""
+        if df.empty:
+            return []
+        missing = [c for c in ("timestamp", "ticker") if c not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns for partitioning: {missing}")
+
+        df = df[df["timestamp"].notna() & df["ticker"].notna()]
+        ts = df["timestamp"].astype(_TS_DTYPE)
+        days = ts.dt.floor("D")
+        rows = df.drop(columns=["ticker"]).assign(timestamp=ts)
+        written = []
+        # one writer per store at a time; partitions are read-modify-write
+        with self._lock:
+            for (ticker, day), pos in rows.groupby([df["ticker"].astype(str), days], sort=True).indices.items():
+                written.append(self._merge(partition_name(ticker, _day(day)), rows.iloc[pos]))
+        return written
+
+    def _merge(self, name: str, rows: pd.DataFrame) -> PartitionStats:
+        path = self._path(name)
+        if os.path.exists(path):
+            old = pd.read_parquet(path)
+            old["timestamp"] = old["timestamp"].astype(_TS_DTYPE)
+            rows = pd.concat([old, rows], ignore_index=True)
+        rows, _ = drop_dupes(rows, keys=["timestamp"], keep="last")
+        rows = rows.sort_values("timestamp", kind="mergesort", ignore_index=True)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            write_parquet([rows], tmp, self.write_options)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        if self.hot is not None:
+            self.hot.discard(name)
+        return self.stats(name)
+
+    def partitions(self, tickers: Optional[Sequence[str]] = None, start=None, end=None) -> List[str]:
+        """Names of the stored partitions of `tickers` whose day overlaps [start, end]."""
+        lo, hi = _day(_utc(start)), _day(_utc(end))
+        if tickers is not None and lo is not None and hi is not None:
+            days = pd.date_range(lo, hi, freq="D").strftime("%Y-%m-%d")
+            names = (partition_name(t, d) for t in tickers for d in days)
+            return [n for n in names if os.path.exists(self._path(n))]
+
+        if tickers is None:
+            ticker_dirs = sorted(d for d in os.listdir(self.root) if d.startswith("ticker="))
+        else:
+            ticker_dirs = [f"ticker={quote(str(t), safe='')}" for t in tickers]
+        names = []
+        for td in ticker_dirs:
+            try:
+                date_dirs = sorted(os.listdir(os.path.join(self.root, td)))
+            except FileNotFoundError:
+                continue
+            for dd in date_dirs:
+                name, date = f"{td}/{dd}", dd.split("=", 1)[-1]
+                if not self.is_partition(name):
+                    continue
+                if (lo is None or date >= lo) and (hi is None or date <= hi) and os.path.exists(self._path(name)):
+                    names.append(name)
+        return names
+
+    def read(
+        self,
+        tickers: Optional[Sequence[str]] = None,
+        start=None,
+        end=None,
+        columns: Optional[Iterable[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Rows of `tickers` (all when None) with `start <= timestamp < end`, sorted by timestamp
+        and ticker. Naive bounds are taken as UTC. `columns` limits the value columns read;
+        timestamp and ticker are always returned.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        start, end = _utc(start), _utc(end)
+        # `end` is exclusive, so a bound at midnight does not need the following day
+        last = None if end is None else end - pd.Timedelta(1, "ns")
+        names = self.partitions(tickers, start, last)
+        if not names:
+            return pd.DataFrame({"timestamp": pd.Series(dtype=_TS_DTYPE), "ticker": pd.Categorical([])})
+
+        hot = self.hot.open(names, self._path) if self.hot is not None else {}
+        tables = []
+        cold = [n for n in names if n not in hot]
+        if cold:
+            partition_schema = pa.schema([("ticker", pa.string()), ("date", pa.string())])
+            partitioning = ds.partitioning(partition_schema, flavor="hive")
+            paths = [self._path(n) for n in cold]
+            dataset = ds.dataset(paths, format="parquet", partitioning=partitioning, partition_base_dir=self.root)
+            # a dataset takes its schema from the first file; partitions may have different columns, so
+            # read them all under the union of the file schemas, missing columns coming back as nulls
+            schema = pa.unify_schemas([f.physical_schema for f in dataset.get_fragments()] + [partition_schema])
+            if schema != dataset.schema:
+                dataset = ds.dataset(
+                    paths, schema=schema, format="parquet", partitioning=partitioning, partition_base_dir=self.root
+                )
+            table = _scan(dataset, start, end, columns)
+            # the hot tables carry the ticker dictionary-encoded; match them so the two concatenate
+            pos = table.schema.get_field_index("ticker")
+            tables.append(table.set_column(pos, "ticker", table.column("ticker").dictionary_encode()))
+        # hot copies may differ in columns, so each is scanned alone and concat_tables fills the gaps
+        for name, table in hot.items():
+            ticker = pa.DictionaryArray.from_arrays(
+                pa.array(np.zeros(table.num_rows, dtype=np.int32)), pa.array([_parse_name(name)[0]])
+            )
+            tables.append(_scan(ds.dataset(table.append_column("ticker", ticker)), start, end, columns))
+        if self.hot is not None:
+            self.hot.record(names, self._path)
+
+        table = pa.concat_tables(tables, promote_options="default") if len(tables) > 1 else tables[0]
+        out = table.to_pandas()
+        out["ticker"] = out["ticker"].astype("category")
+        # categories come in the order the tables were read; sort them so the output order is by name
+        out["ticker"] = out["ticker"].cat.reorder_categories(sorted(out["ticker"].cat.categories))
+        out = out[["timestamp", "ticker", *(c for c in out.columns if c not in ("timestamp", "ticker"))]]
+        return out.sort_values(["timestamp", "ticker"], kind="mergesort", ignore_index=True)
+
+    def delete(self, name: str) -> bool:
+        path = self._path(name)
+        if self.hot is not None:
+            self.hot.discard(name)
+        with self._lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return False
+        for d in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            try:
+                os.rmdir(d)
+            except OSError:
+                break
+        return True
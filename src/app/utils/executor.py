@@ -0,0 +1,175 @@
+from __future__ import annotations
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Literal, Optional, Tuple
+
+from .data import CleanReport, ParquetWriteOptions, clean_crypto_df, read_any, write_parquet
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when a job is submitted while the executor already holds its maximum number of jobs."""
+    def __init__(self, retry_after: int, message: str = "Cleaning executor is saturated.") -> None:
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class JobTimeoutError(Exception):
+    """Raised when a job does not finish within its timeout."""
+    def __init__(self, timeout: float, message: str = "Cleaning job timed out.") -> None:
+        self.timeout = timeout
+        super().__init__(message)
+
+
+class CleaningExecutor:
+    """
+    Runs CPU-bound cleaning jobs off the event loop.
+
+    `kind="process"` sidesteps the GIL entirely at the cost of pickling arguments and results, so
+    jobs should take raw bytes and return small results; `kind="thread"` avoids the copies and
+    only helps for stages that release the GIL (parsing, pyarrow, numpy kernels). Jobs holding
+    objects that cannot cross a process boundary, such as open upload files, use `run_local`,
+    which always runs on threads but shares the same admission limit.
+
+    At most `max_pending` jobs are admitted, running or queued; any more are rejected at once
+    with `ExecutorSaturatedError` rather than queued without bound. A job that times out is
+    reported to the caller but keeps its slot until the worker actually finishes it, since a
+    running job cannot be interrupted.
+    """
+
+    def __init__(
+        self,
+        kind: Literal["process","thread"] = "process",
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timeout: Optional[float] = 300.0,
+        retry_after: int = 5,
+    ) -> None:
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown executor kind: {kind!r}")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._pool: Optional[Executor] = None
+        self._local_pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_pool(self) -> Executor:
+        # created lazily so the pool is forked from the serving worker, not the importing process
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="clean")
+        return self._pool
+
+    def _get_local_pool(self) -> ThreadPoolExecutor:
+        if self._local_pool is None:
+            self._local_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="clean-local")
+        return self._local_pool
+
+    def _release(self, _: Optional[Future]) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ExecutorSaturatedError(self.retry_after)
+            self._pending += 1
+
+    async def _submit(
+        self,
+        pool: Executor,
+        fn: Callable[..., Any],
+        args: Tuple,
+        kwargs: Dict[str, Any],
+        timeout: Optional[float],
+        on_abandon: Optional[Callable[[], Any]],
+    ) -> Any:
+        self._admit()
+        try:
+            future = pool.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            # shield: a timed-out job cannot be stopped, so leave the underlying future running
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()  # only succeeds while the job is still queued
+            self._abandon(future, on_abandon)
+            raise JobTimeoutError(timeout) from None
+        except asyncio.CancelledError:
+            self._abandon(future, on_abandon)
+            raise
+
+    @staticmethod
+    def _abandon(future: Future, on_abandon: Optional[Callable[[], Any]]) -> None:
+        # the caller has given up on the job, which may still produce side effects such as files;
+        # `on_abandon` undoes them once it has finished (or at once if it never started)
+        if on_abandon is not None:
+            future.add_done_callback(lambda _: on_abandon())
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        on_abandon: Optional[Callable[[], Any]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Run `fn(*args, **kwargs)` on the configured pool. With a process pool, `fn` and its arguments
+        must be picklable. If the caller stops waiting, by timeout or cancellation, `on_abandon` is
+        called in this process once the job has finished.
+        """
+        return await self._submit(self._get_pool(), fn, args, kwargs, timeout, on_abandon)
+
+    async def run_local(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        on_abandon: Optional[Callable[[], Any]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Run `fn(*args, **kwargs)` on a thread in this process, for jobs whose arguments cannot be pickled."""
+        return await self._submit(self._get_local_pool(), fn, args, kwargs, timeout, on_abandon)
+
+    def shutdown(self, wait: bool = True) -> None:
+        for pool in (self._pool, self._local_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait, cancel_futures=True)
+        self._pool = self._local_pool = None
+
+
+def clean_bytes(
+    file_bytes: bytes, filename: str, preview_rows: int = 10, **options: Any
+) -> Tuple[list, CleanReport]:
+    """Read, clean and preview an upload in one job, so only the raw bytes and a small result cross the pool."""
+    df = read_any(file_bytes, filename, project=True)
+    cleaned, report = clean_crypto_df(df, copy=False, **options)
+    return cleaned.head(preview_rows).to_dict(orient="records"), report
+
+
+def clean_bytes_to_file(
+    file_bytes: bytes, filename: str, path: str, write_options: Optional[ParquetWriteOptions] = None, **options: Any
+) -> CleanReport:
+    """Read, clean and write an upload to a parquet file at `path` in one job; only the report comes back."""
+    df = read_any(file_bytes, filename, project=True)
+    cleaned, report = clean_crypto_df(df, copy=False, **options)
+    write_parquet([cleaned], path, write_options)
+    return report
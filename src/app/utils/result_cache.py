@@ -0,0 +1,213 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import IO, Any, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from .data import CleanReport, StageStats
+from .symbols import SymbolTable
+
+# bump when a change to the cleaning code makes earlier results stale
+_CACHE_VERSION = 2
+_HASH_BLOCK = 1024 * 1024
+
+try:
+    import xxhash
+
+    def _hasher():
+        return xxhash.xxh3_128()
+except ImportError:
+    def _hasher():
+        return hashlib.blake2b(digest_size=16)
+
+
+def normalize_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonical form of the `clean_crypto_df` options that change its output, so that equivalent
+    requests ("60s" and "1min", "" and no separator, the fill method without resampling) share a key.
+    """
+    freq = options.get("resample_to")
+    if freq:
+        offset = pd.tseries.frequencies.to_offset(freq)
+        freq = f"{offset.nanos}ns" if isinstance(offset, pd.offsets.Tick) else offset.freqstr
+    mapping = options.get("symbol_map")
+    if isinstance(mapping, SymbolTable):
+        mapping = mapping.key()
+    elif mapping:
+        mapping = sorted(mapping.items())
+    return {
+        "resample_to": freq or None,
+        "freq_fill": options.get("freq_fill", "ffill") if freq else None,
+        "base_quote_sep": options.get("base_quote_sep") or None,
+        "symbol_map": mapping or None,
+        "dedup_keep": options.get("dedup_keep") or "first",
+    }
+
+
+def result_key(source: Union[bytes, IO[bytes]], options: Dict[str, Any]) -> str:
+    """Content address of a cleaning result: a hash of the upload bytes plus the normalized options."""
+    h = _hasher()
+    h.update(json.dumps([_CACHE_VERSION, normalize_options(options)], sort_keys=True).encode())
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source)
+    else:
+        source.seek(0)
+        for block in iter(lambda: source.read(_HASH_BLOCK), b""):
+            h.update(block)
+        source.seek(0)
+    return h.hexdigest()
+
+
+def _report_from_dict(data: Dict[str, Any]) -> CleanReport:
+    stages = [StageStats(**s) for s in data.pop("stages", [])]
+    return CleanReport(**data, stages=stages)
+
+
+class ResultCache:
+    """
+    Size-bounded on-disk store of cleaning results, keyed by `result_key`.
+
+    Each entry is `<key>.parquet` with the cleaned frame plus `<key>.json` with its CleanReport,
+    written to a temporary name and renamed into place so readers never see a partial entry.
+    Entries are evicted least recently used first once the parquet files exceed `max_bytes`.
+
+    Recency is tracked in memory, seeded from file mtimes at startup. When several workers share
+    the directory, pass `redis_url` to keep the recency index and sizes in a Redis sorted set
+    instead, so that all of them evict in the same order.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, redis_url: Optional[str] = None, index_key: str = "clean-result-cache") -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_key = index_key
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis
+
+            self._redis = redis.Redis.from_url(redis_url)
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        if self._redis is None:
+            self._load_index()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def _load_index(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".parquet"):
+                st = os.stat(os.path.join(self.directory, name))
+                entries.append((st.st_mtime, name[: -len(".parquet")], st.st_size))
+        for _, key, size in sorted(entries):
+            self._lru[key] = size
+            self._size += size
+
+    def get(self, key: str) -> Optional[Tuple[str, CleanReport]]:
+        """Path of the cached parquet and its report, or None on a miss. A hit counts as a use."""
+        path = self._path(key, "parquet")
+        try:
+            with open(self._path(key, "json")) as f:
+                report = _report_from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        if not os.path.exists(path):
+            return None
+        self._touch(key, os.path.getsize(path))
+        return path, report
+
+    def staging_path(self, key: str) -> str:
+        """
+        Temporary path inside the store for writing a result directly, to be passed to `commit`.
+        Unique per call, so concurrent requests for the same key never write or discard each other's file.
+        """
+        return self._path(f"{key}.{uuid.uuid4().hex}", "tmp")
+
+    def put(self, key: str, parquet: bytes, report: CleanReport) -> str:
+        tmp = self.staging_path(key)
+        with open(tmp, "wb") as f:
+            f.write(parquet)
+        return self.commit(key, tmp, report)
+
+    def commit(self, key: str, staged: str, report: CleanReport) -> str:
+        """Move a staged parquet file into the store with its report and evict down to `max_bytes`."""
+        meta_tmp = staged + ".json"
+        with open(meta_tmp, "w") as f:
+            json.dump(asdict(report), f)
+        # the report goes in last: an entry only counts once its report exists
+        path = self._path(key, "parquet")
+        os.replace(staged, path)
+        os.replace(meta_tmp, self._path(key, "json"))
+        self._touch(key, os.path.getsize(path))
+        self._evict()
+        return path
+
+    def _touch(self, key: str, size: int) -> None:
+        if self._redis is not None:
+            pipe = self._redis.pipeline()
+            pipe.zadd(self.index_key, {key: time.time()})
+            pipe.hset(f"{self.index_key}:size", key, size)
+            pipe.execute()
+            return
+        with self._lock:
+            old = self._lru.pop(key, None)
+            self._size += size - (old or 0)
+            self._lru[key] = size
+
+    def _remove(self, key: str) -> None:
+        for ext in ("json", "parquet"):
+            try:
+                os.remove(self._path(key, ext))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        if self._redis is not None:
+            sizes = self._redis.hgetall(f"{self.index_key}:size")
+            total = sum(int(v) for v in sizes.values())
+            if total <= self.max_bytes:
+                return
+            victims: List[str] = []
+            # the most recent entry is never evicted, even when it alone is over the limit
+            for raw in self._redis.zrange(self.index_key, 0, -2):
+                if total <= self.max_bytes:
+                    break
+                total -= int(sizes.get(raw, 0))
+                victims.append(raw.decode())
+            if victims:
+                self._redis.zrem(self.index_key, *victims)
+                self._redis.hdel(f"{self.index_key}:size", *victims)
+            for key in victims:
+                self._remove(key)
+            return
+
+        with self._lock:
+            victims = []
+            while self._size > self.max_bytes and len(self._lru) > 1:
+                key, size = self._lru.popitem(last=False)
+                self._size -= size
+                victims.append(key)
+        for key in victims:
+            self._remove(key)
+
+
+def preview_parquet(path: str, rows: int = 10) -> List[Dict[str, Any]]:
+    """First `rows` records of a parquet file, without reading the rest of it."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return pd.read_parquet(path).head(rows).to_dict(orient="records")
+    batches = pq.ParquetFile(path).iter_batches(batch_size=rows)
+    batch = next(batches, None)
+    if batch is None:
+        return []
+    return batch.to_pandas().head(rows).to_dict(orient="records")
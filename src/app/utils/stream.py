@@ -0,0 +1,470 @@
+from __future__ import annotations
+import pickle
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .data import (
+    CleaningPipeline,
+    CleanReport,
+    DedupPolicy,
+    StageStats,
+    SymbolMap,
+    _dedup_keys,
+    _dedup_volume,
+    _group_keys,
+    _keep_mask,
+    _mask_outside,
+    _row_fences,
+    fill_missing_ohlcv,
+    row_hashes,
+    validate_schema,
+)
+
+_NAT_NS = np.iinfo(np.int64).min
+
+
+class _StreamDeduper:
+    """
+    Cross-chunk deduplication on 64-bit key hashes. For every live key it remembers the
+    emitted row (chunk number, position in the spooled chunk, volume), so that under the
+    "last" and "max_volume" policies a later duplicate can retract a row that was already
+    spooled; `retracted` lists those rows per chunk for the replay to drop.
+
+    Keys older than the current chunk's earliest timestamp cannot reappear in time-ordered
+    input and are forgotten. `max_keys` additionally bounds the set, forgetting the oldest
+    keys first, so at most `max_keys` keys are carried from one chunk into the next; a
+    duplicate arriving after its key was forgotten is not detected.
+    """
+
+    def __init__(self, keep: DedupPolicy = "first", max_keys: Optional[int] = None) -> None:
+        self.keep = keep
+        self.max_keys = max_keys
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.ts = np.empty(0, dtype=np.int64)
+        self.chunk = np.empty(0, dtype=np.int64)
+        self.pos = np.empty(0, dtype=np.int64)
+        self.volume = np.empty(0, dtype=np.float64)
+        self.retracted: Dict[int, List[np.ndarray]] = {}
+        self.dropped = 0
+
+    def _retain(self, live: np.ndarray) -> None:
+        for name in ("hashes", "ts", "chunk", "pos", "volume"):
+            setattr(self, name, getattr(self, name)[live])
+
+    def _expire(self, ts: np.ndarray) -> None:
+        valid = ts[ts != _NAT_NS]
+        if len(valid):
+            # NaT keys never age out
+            watermark = valid.min()
+            self._retain((self.ts >= watermark) | (self.ts == _NAT_NS))
+        if self.max_keys is not None and len(self.hashes) > self.max_keys:
+            newest = np.argsort(self.ts, kind="stable")[-self.max_keys:]
+            self._retain(np.sort(newest))
+
+    def filter(self, chunk: pd.DataFrame, chunk_no: int) -> pd.DataFrame:
+        """The rows of `chunk` to spool as chunk number `chunk_no`."""
+        keys = _dedup_keys(chunk)
+        hashes = row_hashes(chunk, keys)
+        volume = _dedup_volume(chunk)
+        if volume is None:
+            volume = np.zeros(len(chunk))
+        if "timestamp" in chunk.columns:
+            ts = chunk["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        else:
+            ts = np.full(len(chunk), _NAT_NS, dtype=np.int64)
+        self._expire(ts)
+
+        keep = _keep_mask(hashes, self.keep, volume if self.keep == "max_volume" else None)
+        # winners inside the chunk against the keys emitted earlier; stored hashes are unique
+        match = pd.Index(self.hashes).get_indexer(hashes) if len(self.hashes) else np.full(len(hashes), -1)
+        seen = keep & (match >= 0)
+        if self.keep == "first":
+            replace = np.zeros(len(hashes), dtype=bool)
+        elif self.keep == "last":
+            replace = seen
+        else:
+            held = np.full(len(hashes), np.inf)
+            held[seen] = self.volume[match[seen]]
+            replace = seen & (volume > held)
+        keep &= ~seen | replace
+
+        old = match[replace]
+        for c in np.unique(self.chunk[old]):
+            self.retracted.setdefault(int(c), []).append(self.pos[old][self.chunk[old] == c])
+        self.dropped += int(len(keep) - keep.sum()) + len(old)
+
+        # positions refer to the chunk as spooled, i.e. after this filter
+        pos = np.cumsum(keep) - 1
+        self.chunk[old] = chunk_no
+        self.pos[old] = pos[replace]
+        self.ts[old] = ts[replace]
+        self.volume[old] = volume[replace]
+        new = keep & ~replace
+        self.hashes = np.concatenate([self.hashes, hashes[new]])
+        self.ts = np.concatenate([self.ts, ts[new]])
+        self.chunk = np.concatenate([self.chunk, np.full(int(new.sum()), chunk_no, dtype=np.int64)])
+        self.pos = np.concatenate([self.pos, pos[new]])
+        self.volume = np.concatenate([self.volume, volume[new]])
+        return chunk[keep]
+
+    def apply_retractions(self, chunk: pd.DataFrame, chunk_no: int) -> pd.DataFrame:
+        drop = self.retracted.pop(chunk_no, None)
+        if not drop:
+            return chunk
+        mask = np.ones(len(chunk), dtype=bool)
+        mask[np.concatenate(drop)] = False
+        return chunk[mask]
+
+
+@dataclass
+class _Reservoir:
+    """Fixed-size uniform sample of one column of one group, used to estimate its IQR fences over the whole stream."""
+    size: int
+    values: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    seen: int = 0
+
+    def add(self, chunk: np.ndarray, rng: np.random.Generator) -> None:
+        chunk = chunk[~np.isnan(chunk)]
+        free = self.size - len(self.values)
+        if free > 0:
+            self.values = np.concatenate([self.values, chunk[:free]])
+            self.seen += len(chunk[:free])
+            chunk = chunk[free:]
+        if len(chunk) == 0:
+            return
+        # algorithm R, vectorized: item i (global position seen+i) replaces a random slot with p = size/(seen+i+1)
+        slots = rng.integers(0, self.seen + np.arange(1, len(chunk) + 1))
+        hit = slots < self.size
+        self.values[slots[hit]] = chunk[hit]
+        self.seen += len(chunk)
+
+    def shrink(self, size: int, rng: np.random.Generator) -> None:
+        """Lower the capacity to `size`; a uniform subsample of a uniform sample is still uniform over everything seen."""
+        if len(self.values) > size:
+            self.values = rng.choice(self.values, size, replace=False)
+        self.size = size
+
+    def quartiles(self) -> Tuple[float, float]:
+        if len(self.values) == 0:
+            return np.nan, np.nan
+        q1, q3 = np.quantile(self.values, [0.25, 0.75])
+        return q1, q3
+
+
+class StreamingCleaner:
+    """
+    Chunked counterpart of `clean_crypto_df` for uploads that do not fit in memory.
+    Stage stats in the report are summed over chunks, with the largest chunk's frame size.
+
+    Pass one (`feed`) runs the per-row stages on each chunk, drops duplicates against the keys
+    seen so far and spools the result to disk while sampling the outlier columns. Pass two
+    (`drain`) replays the spool, masks outliers and resamples, carrying the last open bin over
+    to the next chunk. Peak memory is about one chunk plus the outlier samples, independent of
+    file length: `reservoir_budget` floats shared by every (ticker, outlier column) pair, each
+    holding at most `reservoir_size`. As new tickers appear the per-pair capacity is halved as
+    often as needed to stay within the budget, down to `min_reservoir_size`, below which memory
+    grows with the number of tickers (never with the number of rows). Input is assumed to be roughly time
+    ordered, as exchange exports are: dedup state older than the current chunk is dropped and
+    resampling relies on bins closing in order.
+
+    The report is available from `report` once `drain` has been exhausted. For tickers with no
+    more rows than the final per-pair capacity the outlier fences are exact and the output
+    matches `clean_crypto_df`; above that they are estimated from a uniform sample. Rolling-window
+    fences are only available in the in-memory path. Rows retracted by a later duplicate under
+    `dedup_keep="last"` or `"max_volume"` have already been sampled, so their fences may differ
+    slightly from the in-memory ones.
+    """
+
+    def __init__(
+        self,
+        *,
+        symbol_map: SymbolMap = None,
+        base_quote_sep: Optional[str] = "/",
+        resample_to: Optional[str] = None,
+        outlier_cols: Optional[Iterable[str]] = ("open","high","low","close","volume"),
+        freq_fill: Literal["ffill","bfill","none"] = "ffill",
+        outlier_by: Optional[str] = "ticker",
+        reservoir_size: int = 100_000,
+        reservoir_budget: int = 4_000_000,
+        min_reservoir_size: int = 256,
+        dedup_keep: DedupPolicy = "first",
+        dedup_max_keys: Optional[int] = None,
+        spool_dir: Optional[str] = None,
+        seed: int = 0,
+    ) -> None:
+        self.symbol_map = symbol_map
+        self.base_quote_sep = base_quote_sep
+        self.resample_to = resample_to
+        self.outlier_cols = list(outlier_cols or ())
+        self.freq_fill = freq_fill
+        self.outlier_by = outlier_by
+        self.reservoir_size = reservoir_size
+        self.reservoir_budget = reservoir_budget
+        self.min_reservoir_size = min_reservoir_size
+        # current capacity of every reservoir
+        self._reservoir_cap = reservoir_size
+        self._n_reservoirs = 0
+
+        self._rng = np.random.default_rng(seed)
+        self._spool = tempfile.TemporaryFile(dir=spool_dir)
+        self._chunks = 0
+        self._dedup = _StreamDeduper(dedup_keep, dedup_max_keys)
+        # group label -> column -> sample
+        self._reservoirs: Dict[object, Dict[str, _Reservoir]] = {}
+
+        self._rows_in = 0
+        self._cols_before: Optional[List[str]] = None
+        self._inferred: Optional[str] = None
+        self._missing: List[str] = []
+        self._stages: Dict[str, StageStats] = {}
+        self.report: Optional[CleanReport] = None
+
+    def feed(self, chunk: pd.DataFrame) -> None:
+        if self._cols_before is None:
+            self._cols_before = chunk.columns.tolist()
+        self._rows_in += len(chunk)
+
+        # the chunk was just parsed and nobody else holds it, so the pipeline can take it over
+        pipe = CleaningPipeline(chunk, copy=False)
+        pipe.standardize_columns()
+        inferred = pipe.coerce_datetime()
+        if self._chunks == 0:
+            self._inferred = inferred
+            self._missing = validate_schema(pipe.df, required=["timestamp"])
+        pipe.coerce_numeric()
+        pipe.normalize_tickers(self.symbol_map, self.base_quote_sep)
+        self._add_stages(pipe.stages)
+        chunk = self._dedup.filter(pipe.df, self._chunks)
+
+        cols = [c for c in self.outlier_cols if c in chunk.columns]
+        if cols and len(chunk):
+            values = chunk[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+            groups = chunk.groupby(_group_keys(chunk, self.outlier_by), sort=False).indices
+            for label, pos in groups.items():
+                samples = self._reservoirs.setdefault(label, {})
+                for j, c in enumerate(cols):
+                    reservoir = samples.get(c)
+                    if reservoir is None:
+                        self._n_reservoirs += 1
+                        self._fit_budget()
+                        reservoir = samples[c] = _Reservoir(self._reservoir_cap)
+                    reservoir.add(values[pos, j], self._rng)
+
+        pickle.dump(chunk, self._spool, protocol=pickle.HIGHEST_PROTOCOL)
+        self._chunks += 1
+
+    def _fit_budget(self) -> None:
+        """Halve the reservoir capacity until every reservoir fits in the budget, shrinking the existing ones."""
+        cap = self._reservoir_cap
+        while cap > self.min_reservoir_size and cap * self._n_reservoirs > self.reservoir_budget:
+            cap = max(cap // 2, self.min_reservoir_size)
+        if cap == self._reservoir_cap:
+            return
+        self._reservoir_cap = cap
+        for samples in self._reservoirs.values():
+            for reservoir in samples.values():
+                reservoir.shrink(cap, self._rng)
+
+    def _add_stages(self, stages: List[StageStats]) -> None:
+        for st in stages:
+            total = self._stages.get(st.name)
+            if total is None:
+                self._stages[st.name] = StageStats(st.name, st.seconds, st.frame_bytes)
+            else:
+                total.seconds += st.seconds
+                total.frame_bytes = max(total.frame_bytes, st.frame_bytes)
+
+    def _replay(self) -> Iterator[pd.DataFrame]:
+        self._spool.seek(0)
+        for k in range(self._chunks):
+            yield self._dedup.apply_retractions(pickle.load(self._spool), k)
+        self._spool.close()
+
+    def _fences(self) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """Per-group IQR fences from the samples, shaped like `iqr_fences` output."""
+        if not self._reservoirs:
+            return None
+        cols = [c for c in self.outlier_cols if any(c in samples for samples in self._reservoirs.values())]
+        labels = list(self._reservoirs)
+        q = np.full((len(labels), len(cols), 2), np.nan)
+        for i, label in enumerate(labels):
+            for j, c in enumerate(cols):
+                if c in self._reservoirs[label]:
+                    q[i, j] = self._reservoirs[label][c].quartiles()
+        iqr = q[..., 1] - q[..., 0]
+        lo = pd.DataFrame(q[..., 0] - 1.5*iqr, index=pd.Index(labels), columns=cols)
+        hi = pd.DataFrame(q[..., 1] + 1.5*iqr, index=pd.Index(labels), columns=cols)
+        return lo, hi
+
+    def drain(self) -> Iterator[pd.DataFrame]:
+        warnings: List[str] = []
+        if self._inferred is None:
+            warnings.append("زمان‌بندی پیدا نشد یا نامشخص بود؛ سعی شد تبدیل مستقیم انجام شود.")
+        if self._missing:
+            warnings.append(f"ستون‌های ضروری یافت نشد: {self._missing}")
+
+        fences = self._fences()
+        resampler = _CarryResampler(self.resample_to, self.freq_fill) if self.resample_to else None
+
+        rows_out = 0
+        cols_after: Optional[List[str]] = None
+        for chunk in self._replay():
+            if fences is not None and len(chunk):
+                lo, hi = fences
+                cols = [c for c in lo.columns if c in chunk.columns]
+                _mask_outside(chunk, cols, *_row_fences(chunk, self.outlier_by, lo[cols], hi[cols]))
+
+            outputs = [chunk]
+            if resampler is not None:
+                try:
+                    outputs = list(resampler.push(chunk))
+                except Exception as e:
+                    warnings.append(f"خطای بازنمونه‌گیری: {e}")
+                    resampler = None
+
+            for out in outputs:
+                if cols_after is None:
+                    cols_after = out.columns.tolist()
+                rows_out += len(out)
+                yield out
+
+        if resampler is not None:
+            for out in resampler.flush():
+                if cols_after is None:
+                    cols_after = out.columns.tolist()
+                rows_out += len(out)
+                yield out
+
+        self.report = CleanReport(
+            rows_in=self._rows_in,
+            rows_out=rows_out,
+            duplicates_dropped=self._dedup.dropped,
+            cols_before=self._cols_before or [],
+            cols_after=cols_after or [],
+            inferred_ts_unit=self._inferred,
+            warnings=warnings,
+            stages=list(self._stages.values()),
+        )
+
+
+class _CarryResampler:
+    """
+    Resamples successive chunks per group, holding back the raw rows of the last (possibly
+    incomplete) bin. Each group's next expected bin is re-seeded as an empty anchor row so its
+    gap grid continues across chunks, and fill state is kept per group.
+    """
+
+    def __init__(self, freq: str, method: Literal["ffill","bfill","none"], by: Optional[str] = "ticker") -> None:
+        self.freq = freq
+        self.method = method
+        self.by = by
+        self._step = pd.tseries.frequencies.to_offset(freq)
+        self._origin: Optional[pd.Timestamp] = None
+        self._carry: Optional[pd.DataFrame] = None
+        self._next_bin: Optional[pd.Series] = None
+        self._last: Optional[pd.DataFrame] = None
+        self._pending: Optional[pd.DataFrame] = None
+
+    def _by(self, df: pd.DataFrame) -> Optional[str]:
+        return self.by if self.by in df.columns else None
+
+    def _resample(self, buf: pd.DataFrame) -> pd.DataFrame:
+        by = self._by(buf)
+        if self._next_bin is not None:
+            present = buf[by].unique() if by else [0]
+            nxt = self._next_bin[self._next_bin.index.isin(present)]
+            anchors = pd.DataFrame({"timestamp": nxt.to_numpy()})
+            if by:
+                anchors[by] = nxt.index
+            buf = pd.concat([anchors, buf], ignore_index=True)
+        return fill_missing_ohlcv(buf, self.freq, method="none", origin=self._origin, by=by)
+
+    def push(self, chunk: pd.DataFrame) -> Iterator[pd.DataFrame]:
+        if "timestamp" not in chunk.columns:
+            yield chunk
+            return
+        buf = chunk if self._carry is None else pd.concat([self._carry, chunk], ignore_index=True)
+        buf = buf[buf["timestamp"].notna()]
+        if buf.empty:
+            return
+        if self._origin is None:
+            # pin bin edges to the first day so every chunk uses the same grid as a single-frame resample
+            self._origin = buf["timestamp"].min().floor("D")
+
+        out = self._resample(buf)
+        open_bin = out["timestamp"].max()
+        if isinstance(self._step, pd.offsets.Tick):
+            in_open = buf["timestamp"] >= open_bin
+        else:
+            # calendar bins are labelled by their right edge, so go by bin membership instead
+            bins = buf.groupby(pd.Grouper(key="timestamp", freq=self.freq)).ngroup()
+            in_open = bins == bins.max()
+        self._carry = buf[in_open]
+        closed = out[out["timestamp"] < open_bin]
+        if not closed.empty:
+            by = self._by(closed)
+            last_bin = closed.groupby(by)["timestamp"].max() if by else pd.Series([closed["timestamp"].max()], index=[0])
+            nxt = last_bin + self._step
+            self._next_bin = nxt if self._next_bin is None else nxt.combine_first(self._next_bin)
+        yield from self._fill(closed)
+
+    def flush(self) -> Iterator[pd.DataFrame]:
+        if self._carry is not None and not self._carry.empty:
+            out = self._resample(self._carry)
+            self._carry = None
+            yield from self._fill(out, final=True)
+        if self._pending is not None and not self._pending.empty:
+            yield self._pending
+            self._pending = None
+
+    def _fill(self, out: pd.DataFrame, final: bool = False) -> Iterator[pd.DataFrame]:
+        by = self._by(out)
+        value_cols = [c for c in out.columns if c not in ("timestamp", by)]
+
+        if self.method == "ffill":
+            seeded = 0
+            if self._last is not None:
+                seed = self._last[self._last[by].isin(out[by])] if by else self._last
+                seeded = len(seed)
+                out = pd.concat([seed, out], ignore_index=True)
+            grouped = out.groupby(by, sort=False)[value_cols] if by else out[value_cols]
+            out[value_cols] = grouped.ffill()
+            out = out.iloc[seeded:]
+            if not out.empty:
+                tails = out.groupby(by, sort=False).tail(1) if by else out.tail(1)
+                self._last = tails if self._last is None else (
+                    pd.concat([self._last, tails], ignore_index=True).groupby(by, sort=False).tail(1) if by else tails
+                )
+
+        elif self.method == "bfill":
+            # the last bins of a group can only be filled from rows that have not been read yet
+            if self._pending is not None:
+                out = pd.concat([self._pending, out], ignore_index=True)
+            self._pending = None
+            keys = out[by] if by else pd.Series(0, index=out.index)
+            out[value_cols] = out.groupby(keys, sort=False)[value_cols].bfill()
+            if not final:
+                complete = ~out[value_cols].isna().any(axis=1)
+                settled = complete[::-1].groupby(keys[::-1], sort=False).cummax()[::-1]
+                # a group with no complete row at all just has an empty column; nothing will fill it
+                hold = ~settled & complete.groupby(keys, sort=False).transform("any")
+                self._pending, out = out[hold], out[~hold]
+
+        if not out.empty:
+            sort_cols = ["timestamp", *([by] if by else [])]
+            yield out.sort_values(sort_cols, kind="mergesort", ignore_index=True)
+
+
+def clean_crypto_stream(
+    chunks: Iterable[pd.DataFrame],
+    **options,
+) -> Tuple[Iterator[pd.DataFrame], StreamingCleaner]:
+    """Run pass one over `chunks` and return the output iterator plus the cleaner holding the report."""
+    cleaner = StreamingCleaner(**options)
+    for chunk in chunks:
+        cleaner.feed(chunk)
+    return cleaner.drain(), cleaner
@@ -0,0 +1,137 @@
+from __future__ import annotations
+import json
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Mapping, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# quote assets recognised at the end of a symbol written without separator, e.g. XBTUSDT
+_QUOTE_ASSETS = ("USDT", "USDC", "BUSD", "FDUSD", "TUSD", "DAI", "USD", "EUR", "GBP", "TRY", "IRT", "BTC", "ETH", "BNB")
+
+# exchange-specific asset codes and their common names
+_EXCHANGE_ASSETS: Dict[str, Dict[str, str]] = {
+    "kraken": {"XBT": "BTC", "XDG": "DOGE"},
+    "bitmex": {"XBT": "BTC"},
+    "bitfinex": {"UST": "USDT", "IOT": "IOTA", "DSH": "DASH"},
+}
+
+
+def _canonical(symbol: str) -> str:
+    return str(symbol).strip().upper()
+
+
+@dataclass(frozen=True)
+class SymbolTable:
+    """
+    Compiled ticker normalization rules: `symbols` maps whole symbols, `assets` maps asset
+    codes inside a symbol (XBT to BTC), and `quotes` are the quote assets used to split a
+    symbol written without separator into base and quote. Keys are stored upper-cased and
+    stripped, so lookups need no further normalization.
+
+    Tables are immutable and cheap to share; build them once with `compile`, `for_exchange`
+    or `load` and pass the same table to every cleaning run.
+    """
+
+    symbols: Mapping[str, str] = field(default_factory=dict)
+    assets: Mapping[str, str] = field(default_factory=dict)
+    quotes: Tuple[str, ...] = _QUOTE_ASSETS
+    _split: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        quotes = sorted(self.quotes, key=len, reverse=True)
+        split = re.compile(rf"^(?P<base>.+?)(?P<quote>{'|'.join(map(re.escape, quotes))})$") if quotes else None
+        object.__setattr__(self, "_split", split)
+
+    @classmethod
+    def compile(
+        cls,
+        symbols: Optional[Mapping[str, str]] = None,
+        assets: Optional[Mapping[str, str]] = None,
+        quotes: Tuple[str, ...] = _QUOTE_ASSETS,
+    ) -> "SymbolTable":
+        return cls(
+            symbols={_canonical(k): _canonical(v) for k, v in (symbols or {}).items()},
+            assets={_canonical(k): _canonical(v) for k, v in (assets or {}).items()},
+            quotes=tuple(_canonical(q) for q in quotes),
+        )
+
+    @classmethod
+    def for_exchange(cls, exchange: str, symbols: Optional[Mapping[str, str]] = None) -> "SymbolTable":
+        """The built-in asset aliases of `exchange`, plus `symbols` if given."""
+        try:
+            assets = _EXCHANGE_ASSETS[exchange.lower()]
+        except KeyError:
+            raise ValueError(f"No alias table for exchange: {exchange!r}") from None
+        return cls.compile(symbols, assets)
+
+    @classmethod
+    def load(cls, path: str) -> "SymbolTable":
+        """Read a table saved with `save`: a JSON object with `symbols`, `assets` and optionally `quotes`."""
+        with open(path) as f:
+            data = json.load(f)
+        return cls.compile(data.get("symbols"), data.get("assets"), tuple(data.get("quotes", _QUOTE_ASSETS)))
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"symbols": dict(self.symbols), "assets": dict(self.assets), "quotes": list(self.quotes)}, f, indent=2)
+
+    def with_symbols(self, symbols: Mapping[str, str]) -> "SymbolTable":
+        """A copy with `symbols` added on top of this table's whole-symbol mapping."""
+        merged = {**self.symbols, **{_canonical(k): _canonical(v) for k, v in symbols.items()}}
+        return SymbolTable(merged, self.assets, self.quotes)
+
+    def key(self) -> Tuple:
+        """Hashable, order-independent description of the table, e.g. for cache keys."""
+        return (tuple(sorted(self.symbols.items())), tuple(sorted(self.assets.items())), self.quotes)
+
+    def normalize(self, labels: pd.Index, base_quote_sep: Optional[str] = None) -> np.ndarray:
+        """
+        Normalize distinct ticker labels: strip and upper-case, drop `base_quote_sep` from the
+        labels that contain it, rename asset codes, then apply the whole-symbol mapping, which
+        is also matched against the label before the separator is dropped. Missing labels stay
+        missing.
+        """
+        raw = pd.Series(labels, dtype=object)
+        missing = raw.isna().to_numpy()
+        s = raw.astype(str).str.strip().str.upper()
+        out = s
+
+        if self.assets:
+            if base_quote_sep:
+                parts = s.str.split(base_quote_sep, n=1, regex=False, expand=True).reindex(columns=[0, 1]).astype(object)
+                has_sep = parts[1].notna()
+            else:
+                parts = pd.DataFrame({0: s, 1: np.nan}, index=s.index, dtype=object)
+                has_sep = pd.Series(False, index=s.index)
+            if self._split is not None:
+                # symbols without separator are split on a known quote suffix
+                found = s[~has_sep].str.extract(self._split)
+                idx = found.index[found["base"].notna()]
+                parts.loc[idx, 0] = found.loc[idx, "base"]
+                parts.loc[idx, 1] = found.loc[idx, "quote"]
+            base = parts[0].map(self.assets).fillna(parts[0])
+            quote = parts[1].map(self.assets).fillna(parts[1])
+            out = base.where(quote.isna(), base + quote.fillna(""))
+        elif base_quote_sep:
+            out = s.str.replace(base_quote_sep, "", regex=False)
+
+        if self.symbols:
+            out = out.map(self.symbols).fillna(s.map(self.symbols)).fillna(out)
+        result = out.to_numpy(dtype=object)
+        result[missing] = np.nan
+        return result
+
+
+@lru_cache(maxsize=256)
+def _compiled(items: Tuple[Tuple[str, str], ...]) -> SymbolTable:
+    return SymbolTable.compile(dict(items))
+
+
+def symbol_table(mapping: Union[Mapping[str, str], SymbolTable, None]) -> SymbolTable:
+    """The table for a plain mapping, compiled once per distinct mapping; tables pass through."""
+    if isinstance(mapping, SymbolTable):
+        return mapping
+    return _compiled(tuple(sorted((mapping or {}).items())))
@@ -1,22 +1,137 @@
-import httpx
+import heapq
+import sys
 import time
+from collections import OrderedDict
+
+import httpx
 
 client = httpx.AsyncClient(timeout=15.0)
 
-_cache = {}
+MAX_ENTRIES = 10_000
+MAX_BYTES = 64 * 1024 * 1024
+# expired entries are swept on writes at most this often, besides being dropped when read
+SWEEP_INTERVAL = 5.0
+
+
+def _sizeof(value, _seen=None) -> int:
+    """Approximate memory held by a JSON-like value."""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(k, _seen) + _sizeof(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_sizeof(v, _seen) for v in value)
+    return size
+
+
+class TTLCache:
+    """
+    In-memory cache bounded by entry count and approximate bytes, evicting least recently used
+    entries first. Expired entries are dropped when read and swept from an expiry heap on writes.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, sweep_interval: float = SWEEP_INTERVAL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()  # key -> (value, expire_at, size)
+        self._expiry = []  # (expire_at, key), may hold outdated pairs of overwritten keys
+        self._next_sweep = 0.0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        data = self._entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        value, expire_at, _ = data
+        if time.time() > expire_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value, ttl: float) -> None:
+        now = time.time()
+        size = _sizeof(value)
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        expire_at = now + ttl
+        self._entries[key] = (value, expire_at, size)
+        self.bytes += size
+        heapq.heappush(self._expiry, (expire_at, key))
+        if now >= self._next_sweep:
+            self.sweep(now)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def sweep(self, now: float | None = None) -> int:
+        """Drop every expired entry; returns how many were dropped."""
+        now = time.time() if now is None else now
+        self._next_sweep = now + self.sweep_interval
+        dropped = 0
+        while self._expiry and self._expiry[0][0] < now:
+            expire_at, key = heapq.heappop(self._expiry)
+            data = self._entries.get(key)
+            if data is not None and data[1] == expire_at:
+                self._remove(key)
+                dropped += 1
+        self.expirations += dropped
+        # outdated pairs pile up when keys are rewritten before they expire
+        if len(self._expiry) > 2 * len(self._entries) + 1024:
+            self._expiry = [(data[1], key) for key, data in self._entries.items()]
+            heapq.heapify(self._expiry)
+        return dropped
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._expiry.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache = TTLCache()
 
 
 def set_cache(key: str, value: dict, ttl: int = 40):
-    expire_at = time.time() + ttl
-    _cache[key] = (value, expire_at)
+    _cache.set(key, value, ttl)
 
 
 def get_cache(key: str):
-    data = _cache.get(key)
-    if not data:
-        return None
-    value, expire_at = data
-    if time.time() > expire_at:
-        _cache.pop(key, None)
-        return None
-    return value
\ No newline at end of file
+    return _cache.get(key)
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the app's modules import each other as top-level packages (`utils.data`), as when run from src/app
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "app"))
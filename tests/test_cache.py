@@ -0,0 +1,189 @@
+import asyncio
+import fnmatch
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("redis")
+from fastapi import Request  # noqa: E402
+
+# skipped where the app's exception package is not importable alongside utils
+catch = pytest.importorskip("utils.catch")
+
+
+class FakeRedis:
+    """The subset of redis.asyncio.Redis the cache decorator uses, kept in a dict."""
+
+    def __init__(self) -> None:
+        self.data: dict = {}
+        self.expiry: dict = {}
+        self.gets = 0
+        self.registered: list = []
+
+    def _alive(self, key):
+        if key in self.expiry and time.time() > self.expiry[key]:
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    async def get(self, key):
+        self.gets += 1
+        return self.data[key] if self._alive(key) else None
+
+    async def exists(self, key):
+        return int(self._alive(key))
+
+    async def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and self._alive(key):
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        if px:
+            self.expiry[key] = time.time() + px / 1000
+        elif ex:
+            self.expiry[key] = time.time() + ex
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def scan(self, cursor, match="*", count=100):
+        return 0, [key for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+    async def publish(self, channel, message):
+        return 0
+
+    def register_script(self, source):
+        self.registered.append(source)
+        return _FakeScript(self, source)
+
+    async def run_script(self, source, keys, argv):
+        if source is catch._REGISTER_TAGS:
+            for tag in keys:
+                self.data.setdefault(tag, set()).add(argv[0])
+            return None
+        if source is catch._POP_TAG:
+            return sorted(self.data.pop(keys[0], set()))
+        if source is catch._RELEASE_LOCK:
+            if self.data.get(keys[0]) == argv[0].encode():
+                del self.data[keys[0]]
+                return 1
+            return 0
+        raise AssertionError("unexpected script")
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakeScript:
+    def __init__(self, redis: FakeRedis, source: str) -> None:
+        self.redis = redis
+        self.source = source
+
+    async def __call__(self, keys=None, args=None, client=None):
+        if isinstance(client, _FakePipeline):
+            client.calls.append(("run_script", (self.source, keys or [], args or []), {}))
+            return client
+        return await self.redis.run_script(self.source, keys or [], args or [])
+
+
+class _FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.calls: list = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def _request(method: str) -> Request:
+    return Request({"type": "http", "method": method, "headers": []})
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(catch, "client", fake)
+    monkeypatch.setattr(catch, "_local_caches", {})
+    monkeypatch.setattr(catch, "_loaders", {})
+    return fake
+
+
+def test_endpoint_called_with_keyword_arguments_only(redis):
+    calls = []
+
+    @catch.cache(key_prefix="{username}_single_post_cache", resource_id_name="post_id")
+    async def get_post(req: Request, username: str, post_id: int) -> dict:
+        calls.append(post_id)
+        return {"id": post_id, "title": "hello"}
+
+    async def main():
+        # FastAPI calls endpoints with keyword arguments only
+        first = await get_post(req=_request("GET"), username="a", post_id=1)
+        second = await get_post(req=_request("GET"), username="a", post_id=1)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == {"id": 1, "title": "hello"}
+    assert calls == [1]
+    assert redis.data.get("a_single_post_cache:1") is not None
+
+
+def test_endpoint_without_request_parameter_is_rejected():
+    with pytest.raises(ValueError):
+
+        @catch.cache(key_prefix="posts", resource_id_name="post_id")
+        async def get_post(post_id: int) -> dict:
+            return {}
+
+
+def test_repeated_read_is_served_locally_until_a_write(redis, monkeypatch):
+    # as while listen_for_invalidations is subscribed
+    monkeypatch.setattr(catch, "_listening", True)
+    posts = {1: "old"}
+
+    @catch.cache(key_prefix="{username}_single_post_cache", resource_id_name="post_id", local_ttl=5, local_max_entries=16)
+    async def get_post(req: Request, username: str, post_id: int) -> dict:
+        return {"id": post_id, "title": posts[post_id]}
+
+    @catch.cache("{username}_single_post_cache", resource_id_name="post_id")
+    async def update_post(req: Request, username: str, post_id: int, title: str) -> dict:
+        posts[post_id] = title
+        return {"message": "ok"}
+
+    async def main():
+        await get_post(req=_request("GET"), username="a", post_id=1)
+        gets = redis.gets
+        assert await get_post(req=_request("GET"), username="a", post_id=1) == {"id": 1, "title": "old"}
+        assert redis.gets == gets
+
+        await update_post(req=_request("PATCH"), username="a", post_id=1, title="new")
+        assert await get_post(req=_request("GET"), username="a", post_id=1) == {"id": 1, "title": "new"}
+        assert redis.gets > gets
+
+    asyncio.run(main())
+
+
+def test_scripts_are_registered_once_per_client(redis):
+    @catch.cache(key_prefix="{username}_posts_cache:page_{page}", resource_id_name="username")
+    async def list_posts(req: Request, username: str, page: int = 1) -> dict:
+        return {"page": page}
+
+    @catch.cache("{username}_single_post_cache", resource_id_name="post_id", pattern_to_invalidate_extra=["{username}_posts_cache:*"])
+    async def delete_post(req: Request, username: str, post_id: int) -> dict:
+        return {"message": "deleted"}
+
+    async def main():
+        for _ in range(2):
+            for page in (1, 2):
+                await list_posts(req=_request("GET"), username="a", page=page)
+            await delete_post(req=_request("DELETE"), username="a", post_id=1)
+
+    asyncio.run(main())
+    assert sorted(redis.registered) == sorted([catch._REGISTER_TAGS, catch._RELEASE_LOCK, catch._POP_TAG])
+    # both rounds of pages were found through the tag set and deleted
+    assert not [key for key in redis.data if key.startswith("a_posts_cache:")]
@@ -0,0 +1,35 @@
+import pytest
+
+from utils.cache_codec import Codec
+
+
+def _encoded(compression="zlib"):
+    codec = Codec(serializer="json", compression=compression, compress_min_bytes=0)
+    return codec.encode({"prices": list(range(100))}, 0.5, 1e9)
+
+
+def test_roundtrip():
+    assert Codec.decode(_encoded()) == ({"prices": list(range(100))}, 0.5, 1e9)
+
+
+def test_plain_json_is_not_a_codec_value():
+    assert Codec.decode(b'{"a": 1}') is None
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda raw: raw[:10],  # truncated header
+        lambda raw: raw[:-20],  # truncated compressed payload
+        lambda raw: raw[:24] + b"\xff" * (len(raw) - 24),  # garbage compressed payload
+    ],
+)
+def test_corrupt_values_raise_value_error(corrupt):
+    with pytest.raises(ValueError):
+        Codec.decode(corrupt(_encoded()))
+
+
+def test_corrupt_uncompressed_payload_raises_value_error():
+    raw = _encoded(compression=None)
+    with pytest.raises(ValueError):
+        Codec.decode(raw[:-5])
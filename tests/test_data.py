@@ -0,0 +1,65 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from utils.data import clean_crypto_df, coerce_numeric, normalize_tickers
+
+
+def test_normalize_tickers_all_nan_column():
+    df = pd.DataFrame({"ticker": [np.nan, np.nan], "close": [1.0, 2.0]})
+    out = normalize_tickers(df)
+    assert out["ticker"].isna().all()
+    assert len(out) == 2
+
+
+def test_normalize_tickers_keeps_nan_rows():
+    df = pd.DataFrame({"ticker": ["btc/usdt", np.nan, "BTC/USDT"]})
+    out = normalize_tickers(df)
+    assert out["ticker"].iloc[0] == out["ticker"].iloc[2]
+    assert pd.isna(out["ticker"].iloc[1])
+
+
+def test_coerce_numeric_leaves_timestamp_columns_alone():
+    df = pd.DataFrame({"timestamp_close": ["2024-01-01 00:01:00"], "close": ["1.5"]})
+    out = coerce_numeric(df)
+    assert out["timestamp_close"].tolist() == ["2024-01-01 00:01:00"]
+    assert out["close"].tolist() == [1.5]
+
+
+def test_clean_all_nan_ticker_column():
+    df = pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2024-01-01", periods=3, freq="min").astype(str),
+            "ticker": [np.nan] * 3,
+            "close": [1.0, 2.0, 3.0],
+        }
+    )
+    out, _ = clean_crypto_df(df)
+    assert out["close"].tolist() == [1.0, 2.0, 3.0]
+    assert out["ticker"].isna().all()
+
+
+def test_ambiguous_day_month_is_month_first_regardless_of_history():
+    # a day-first column of the same shape resolves first, and must not decide the next one
+    _, _ = clean_crypto_df(_timestamps(["25/01/2024 10:00:00", "26/01/2024 10:00:00"]), outlier_cols=None)
+    out, _ = clean_crypto_df(_timestamps(["01/02/2024 10:00:00", "03/02/2024 10:00:00"]), outlier_cols=None)
+    assert out["timestamp"].dt.month.tolist() == [1, 3]
+    assert out["timestamp"].dt.day.tolist() == [2, 2]
+
+
+def test_day_first_column_still_parses():
+    out, _ = clean_crypto_df(_timestamps(["25/01/2024 10:00:00", "01/02/2024 10:00:00"]), outlier_cols=None)
+    assert out["timestamp"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-25", "2024-02-01"]
+
+
+def _timestamps(values):
+    return pd.DataFrame({"timestamp": values, "ticker": ["BTC/USDT"] * len(values), "close": [1.0] * len(values)})
+
+
+def test_profile_memory_records_stage_peaks():
+    df = _timestamps(["2024-01-01 10:00:00", "2024-01-01 10:01:00"])
+    _, report = clean_crypto_df(df, profile_memory=True)
+    peaks = [stage.peak_bytes for stage in report.stages]
+    assert peaks and all(peak is not None and peak >= 0 for peak in peaks)
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from utils.dataset import DatasetStore, HotTier
+
+
+def _frame(ticker, **values):
+    n = len(next(iter(values.values())))
+    return pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2024-01-01", periods=n, freq="h", tz="UTC"),
+            "ticker": [ticker] * n,
+            **values,
+        }
+    )
+
+
+def _store(tmp_path, hot=False):
+    tier = HotTier(str(tmp_path / "hot"), max_bytes=1 << 30, promote_after=1) if hot else None
+    store = DatasetStore(str(tmp_path / "data"), hot=tier)
+    store.write(_frame("AAA", close=[1.0, 2.0]))
+    store.write(_frame("BBB", close=[3.0, 4.0], volume=[10.0, 20.0]))
+    return store
+
+
+def test_read_keeps_columns_missing_from_some_partitions(tmp_path):
+    out = _store(tmp_path).read()
+    assert "volume" in out.columns
+    assert out.loc[out["ticker"] == "BBB", "volume"].tolist() == [10.0, 20.0]
+    assert out.loc[out["ticker"] == "AAA", "volume"].isna().all()
+
+
+def test_read_promoted_partitions_with_different_columns(tmp_path):
+    store = _store(tmp_path, hot=True)
+    first = store.read()
+    # the first read promotes both partitions, so this one is served from the hot tier
+    second = store.read()
+    pd.testing.assert_frame_equal(first, second)
+    assert store.read(columns=["volume"])["volume"].notna().sum() == 2
@@ -0,0 +1,41 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from utils.executor import CleaningExecutor, JobTimeoutError
+
+
+def _slow_write(path: str, seconds: float) -> None:
+    time.sleep(seconds)
+    with open(path, "wb") as f:
+        f.write(b"late")
+
+
+def test_abandoned_job_is_cleaned_up_after_it_finishes(tmp_path):
+    executor = CleaningExecutor("thread", max_workers=1, timeout=0.05)
+    path = str(tmp_path / "out.parquet")
+    abandoned = []
+
+    def discard() -> None:
+        abandoned.append(os.path.exists(path))
+        os.remove(path)
+
+    async def main() -> None:
+        with pytest.raises(JobTimeoutError):
+            await executor.run(_slow_write, path, 0.2, on_abandon=discard)
+
+    asyncio.run(main())
+    executor.shutdown(wait=True)
+    assert abandoned == [True]
+    assert not os.path.exists(path)
+
+
+def test_finished_job_is_not_abandoned(tmp_path):
+    executor = CleaningExecutor("thread", max_workers=1)
+    path = str(tmp_path / "out.parquet")
+    calls = []
+    asyncio.run(executor.run(_slow_write, path, 0, on_abandon=lambda: calls.append(1)))
+    executor.shutdown(wait=True)
+    assert calls == [] and os.path.exists(path)
@@ -0,0 +1,26 @@
+import os
+
+from utils.data import CleanReport
+from utils.result_cache import ResultCache
+
+
+def _report() -> CleanReport:
+    return CleanReport(
+        rows_in=1, rows_out=1, duplicates_dropped=0, cols_before=["a"], cols_after=["a"], inferred_ts_unit=None, warnings=[]
+    )
+
+
+def test_concurrent_staging_of_one_key_does_not_collide(tmp_path):
+    store = ResultCache(str(tmp_path), max_bytes=1 << 20)
+    first, second = store.staging_path("k"), store.staging_path("k")
+    assert first != second
+    for staged, payload in ((first, b"one"), (second, b"two")):
+        with open(staged, "wb") as f:
+            f.write(payload)
+
+    # abandoning one request's file leaves the other one committable
+    os.remove(first)
+    path = store.commit("k", second, _report())
+    with open(path, "rb") as f:
+        assert f.read() == b"two"
+    assert store.get("k")[1].rows_out == 1
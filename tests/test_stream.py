@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from utils.data import clean_crypto_df
+from utils.stream import clean_crypto_stream
+
+
+def _chunks(tickers, rows_per_ticker, chunk_rows=5_000, seed=0):
+    rng = np.random.default_rng(seed)
+    n = tickers * rows_per_ticker
+    df = pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2024-01-01", periods=n, freq="s", tz="UTC"),
+            "ticker": [f"T{i % tickers}/USDT" for i in range(n)],
+            "close": rng.normal(100, 1, n),
+            "volume": rng.exponential(10, n),
+        }
+    )
+    return df, [df.iloc[i : i + chunk_rows] for i in range(0, n, chunk_rows)]
+
+
+def test_reservoirs_share_one_budget():
+    _, chunks = _chunks(tickers=200, rows_per_ticker=100)
+    outputs, cleaner = clean_crypto_stream(chunks, reservoir_size=1_000, reservoir_budget=40_000, outlier_cols=["close", "volume"])
+    for _ in outputs:
+        pass
+    held = sum(len(r.values) for samples in cleaner._reservoirs.values() for r in samples.values())
+    assert held <= 40_000
+    assert cleaner._reservoir_cap < 1_000
+
+
+def test_small_streams_match_in_memory_clean():
+    df, chunks = _chunks(tickers=3, rows_per_ticker=200)
+    streamed = pd.concat(list(clean_crypto_stream(chunks, outlier_cols=["close", "volume"])[0]), ignore_index=True)
+    expected, _ = clean_crypto_df(df, outlier_cols=["close", "volume"])
+    np.testing.assert_allclose(streamed["close"].to_numpy(), expected["close"].to_numpy())